@@ -1,16 +1,54 @@
 import streamlit as st
-import google.generativeai as genai
+from streamlit.errors import StreamlitSecretNotFoundError
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from PIL import Image, ImageEnhance, ImageFilter
 import io
 import os
+import functools
+import hashlib
+import math
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import weakref
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import numpy as np
 from PIL import ImageOps
 
+# Uploads are refused above these limits before any pixels are decoded
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+MAX_UPLOAD_PIXELS = 50_000_000
+
+# Lower Pillow's decompression-bomb threshold to match
+Image.MAX_IMAGE_PIXELS = MAX_UPLOAD_PIXELS
+
+# Optional: OpenCV accelerates the heavier filters, PIL is used as a fallback
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# Optional: PyTurboJPEG calls libjpeg-turbo directly for faster encoding, Pillow is used as a fallback
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJPF_GRAY, TJSAMP_GRAY, TJFLAG_PROGRESSIVE
+    turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    turbo_jpeg = None
+
+# Optional: jpegli's cjpegli gives smaller JPEGs at the same quality, Pillow is used as a fallback
+CJPEGLI_PATH = shutil.which('cjpegli')
+
 # Import authentication
 from simple_auth import SimpleAuthenticator
 
+# Static style tables live in their own module, so they are built once instead of on every rerun
+from styles import STYLE_VARIATIONS, CROP_PRESETS, ENHANCEMENT_CLAUSES, FULL_CHROMA_VARIATIONS
+
 # Page config
 st.set_page_config(
     page_title="Photo Style Converter Pro",
@@ -32,8 +70,9 @@ if not auth.require_authentication():
 # Show user info in sidebar (will be added at the end)
 # auth.show_user_info(location='sidebar')
 
-# Custom CSS
-st.markdown("""
+# Custom CSS - st.html sends style-only content to the event container, so it skips the
+# markdown renderer and takes no space in the layout
+CUSTOM_CSS = """
     <style>
     .stButton>button {
         width: 100%;
@@ -55,15 +94,17 @@ st.markdown("""
         margin: 10px 0;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+
+st.html(CUSTOM_CSS)
 
 # Initialize session state
-if 'original_images' not in st.session_state:
-    st.session_state.original_images = []
+if 'original_bytes' not in st.session_state:
+    st.session_state.original_bytes = []
+if 'upload_digests' not in st.session_state:
+    st.session_state.upload_digests = []
 if 'edited_images' not in st.session_state:
     st.session_state.edited_images = []
-if 'working_images' not in st.session_state:
-    st.session_state.working_images = []
 if 'current_adjustments' not in st.session_state:
     st.session_state.current_adjustments = {}
 if 'sample_variations' not in st.session_state:
@@ -81,85 +122,154 @@ if 'model_photo' not in st.session_state:
 if 'detected_ages' not in st.session_state:
     st.session_state.detected_ages = {}
 if 'uploader_key' not in st.session_state:
-    import time
     st.session_state.uploader_key = int(time.time())
 
-# Style variations
-STYLE_VARIATIONS = {
-    "passport": {
-        "US Passport": "official US passport photo style, neutral expression, plain white background, head to shoulders visible, centered composition, even lighting, no shadows, professional government document photo",
-        "Indian Passport": "official Indian passport photo style, neutral expression, plain white background, 80% face coverage, ears visible, centered composition, even lighting, professional government document photo",
-        "UK Passport": "official UK passport photo style, neutral expression, plain light grey background, head to shoulders visible, centered composition, even lighting, no shadows, professional government document photo",
-        "EU Passport": "official European Union passport photo style, neutral expression, plain light background, head to shoulders visible, centered composition, even lighting, professional government document photo"
-    },
-    "professional": {
-        "Corporate Executive": "professional corporate executive headshot framed from head to chest level, dark suit, confident expression, modern office background, studio lighting, sharp focus, professional portrait crop",
-        "Creative Professional": "professional creative industry headshot framed from head to chest level, smart casual attire, approachable expression, bright modern workspace, natural lighting, professional portrait crop",
-        "LinkedIn Classic": "classic professional LinkedIn profile photo framed from head to chest level, business formal attire, neutral background, professional studio portrait, proper headshot framing",
-        "Business Casual": "professional business casual style headshot framed from head to chest level, relaxed yet polished, contemporary setting, friendly professional demeanor, proper portrait crop"
-    },
-    "fun": {
-        "Vibrant Pop Art": "fun vibrant pop art style, bold bright colors, playful energy, comic book aesthetic, dynamic composition",
-        "Cheerful Cartoon": "fun cheerful cartoon illustration style, cute animated look, happy colors, whimsical playful mood",
-        "Festival Vibes": "fun festival party vibes, colorful energetic atmosphere, celebration mood, joyful expression, confetti and lights",
-        "Retro Fun": "fun retro 80s style, neon colors, playful vintage aesthetic, energetic disco vibes"
-    },
-    "artistic": {
-        "Oil Painting": "artistic oil painting masterpiece, rich textures, classical art style, museum quality, painterly brushstrokes",
-        "Watercolor Dream": "artistic watercolor painting, soft flowing colors, dreamy ethereal quality, delicate artistic touch",
-        "Digital Art": "artistic digital illustration, modern creative style, vibrant artistic interpretation, unique visual design",
-        "Impressionist": "artistic impressionist style, loose brushwork, play of light, artistic color palette, Monet-inspired"
-    },
-    "doodle": {
-        "Simple Line Doodle": "simple black line doodle sketch, minimalist hand-drawn style, playful cartoon outline, cute simple illustration",
-        "Colored Doodle": "colorful doodle art, vibrant hand-drawn sketch, playful illustrated style, fun cartoon aesthetic",
-        "Notebook Sketch": "casual notebook doodle, pen sketch style, informal hand-drawn look, spontaneous artistic sketch",
-        "Comic Doodle": "comic book doodle style, bold outlines, dynamic cartoon illustration, fun graphic novel aesthetic"
-    },
-    "ghibli": {
-        "Studio Ghibli": "Studio Ghibli anime art style, soft watercolor aesthetic, dreamy whimsical animation, Miyazaki-inspired illustration, gentle pastel colors",
-        "Spirited Away Style": "Spirited Away anime style, detailed Ghibli animation, magical whimsical atmosphere, soft lighting, enchanting scenery",
-        "My Neighbor Totoro": "My Neighbor Totoro art style, warm gentle Ghibli aesthetic, countryside pastoral scenes, soft friendly animation",
-        "Howl's Moving Castle": "Howl's Moving Castle style, romantic Ghibli animation, detailed fantasy aesthetic, magical dreamy atmosphere"
-    },
-    "vintage": {
-        "1970s Film": "vintage 1970s film photography, warm tones, nostalgic film grain, classic retro aesthetic",
-        "Sepia Classic": "vintage sepia tone photograph, antique timeless look, historical photography style",
-        "Polaroid Nostalgia": "vintage polaroid style, instant film aesthetic, faded colors, nostalgic retro charm",
-        "Black & White Classic": "vintage black and white photography, classic film noir style, dramatic contrast, timeless elegance"
-    },
-    "modern": {
-        "Minimalist Chic": "modern minimalist style, clean lines, contemporary aesthetic, simple sophisticated look",
-        "High Fashion": "modern high fashion editorial, sleek polished style, contemporary magazine quality",
-        "Urban Contemporary": "modern urban contemporary style, city vibes, trendy modern aesthetic, sharp details",
-        "Tech Forward": "modern tech-forward style, futuristic clean look, innovative contemporary design"
-    }
-}
+# Session keys dropped by the reset buttons - authentication keys are left in place
+RESET_KEYS = (
+    'original_bytes', 'upload_digests', 'edited_images', 'current_adjustments',
+    'sample_variations', 'selected_samples', 'generated_images', 'previous_style',
+    'custom_background', 'model_photo', 'detected_ages', 'detecting_age',
+    'enhancements', 'show_individual', 'slider_state', 'slider_idx',
+    'last_preview_id', 'zip_cache', 'preview_cache',
+    'api_image_cache', 'edit_cache', 'generation_memo',
+    'generation_pending', 'age_memo', 'uploaded_count', 'rejected_uploads',
+    # Variation picks are widget state, one multiselect per style
+    *(f"variations_{style}" for style in STYLE_VARIATIONS)
+)
+
+def reset_workspace():
+    """Drop all image/work state for this session, keeping the user logged in"""
+    # Only this session's keys - st.cache_data is shared by every user, so it is left alone
+    for key in RESET_KEYS:
+        st.session_state.pop(key, None)
+    
+    # Force new uploader key
+    st.session_state.uploader_key = int(time.time())
 
-# Preset crop ratios
-CROP_PRESETS = {
-    "Instagram Square": (1, 1),
-    "Instagram Portrait": (4, 5),
-    "Facebook Cover": (16, 9),
-    "Passport Photo": (35, 45),
-    "LinkedIn Banner": (4, 1),
-    "Original": None
+# Basic adjustment slider keys and their defaults
+BASIC_SLIDER_DEFAULTS = {
+    "bright": 1.0,
+    "contrast": 1.0,
+    "sat": 1.0,
+    "sharp": 1.0
 }
 
+# Static page fragments - plain literals, so a rerun only loads them from the cached compiled script
+ADMIN_BANNER_HTML = """
+<div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
+            padding: 20px; border-radius: 10px; margin-bottom: 20px;'>
+    <h3 style='color: white; margin: 0;'>🔧 Administrator Tools</h3>
+    <p style='color: #f0f0f0; margin: 5px 0 0 0; font-size: 0.9em;'>
+        Create and manage user accounts with time-bound or permanent access
+    </p>
+</div>
+"""
+
+SIDEBAR_FEATURES_MD = """
+### Features:
+
+**Photo Editing:**
+- ✅ Batch upload & processing
+- ✅ Brightness, contrast, saturation
+- ✅ Crop with presets (Instagram, LinkedIn, etc.)
+- ✅ Rotate & resize
+- ✅ Noise reduction
+- ✅ AI upscaling
+
+**AI Style Conversion:**
+- ✅ 6 style categories (Passport, Professional, Fun, Artistic, Vintage, Modern)
+- ✅ 4 variations per style
+- ✅ Custom background replacement
+- ✅ Professional enhancements
+- ✅ Remove grey hair option
+- ✅ AI age detection
+- ✅ Age preservation or transformation
+- ✅ Passport photo specifications
+- ✅ Head-to-chest crop for professional
+
+**Download Options:**
+- ✅ Bulk ZIP download
+- ✅ Individual image download
+
+---
+
+**Privacy:** No images stored on servers
+
+**Powered by:** Google Gemini 2.5 Flash
+"""
+
+FOOTER_HTML = (
+    "<p style='text-align: center; color: #666; font-size: 14px;'>"
+    "🔒 <b>Privacy First:</b> All processing happens in real-time. No images are stored on our servers."
+    "</p>"
+)
+
 def convert_to_rgb(image):
     """Convert image to RGB mode for JPEG compatibility"""
-    if image.mode == 'RGBA':
-        # Create white background and paste image with alpha mask
-        rgb_image = Image.new('RGB', image.size, (255, 255, 255))
-        rgb_image.paste(image, mask=image.split()[3])  # Use alpha channel as mask
-        return rgb_image
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        # Composite onto a white background in a single vectorized pass
+        rgba = image if image.mode == 'RGBA' else image.convert('RGBA')
+        arr = np.asarray(rgba, dtype=np.uint16)
+        alpha = arr[..., 3:]
+        rgb = (arr[..., :3] * alpha + 255 * (255 - alpha) + 127) // 255
+        return Image.fromarray(rgb.astype(np.uint8))
     elif image.mode not in ('RGB', 'L'):
         # Convert any other mode to RGB
         return image.convert('RGB')
     return image
 
+# Seconds a decoded upload stays in the shared decode caches
+DECODE_CACHE_TTL = 30 * 60
+
+def check_upload(data):
+    """Reason uploaded file bytes can't be used, or None - only the image header is read"""
+    too_many_pixels = f"larger than {MAX_UPLOAD_PIXELS // 1_000_000} megapixels"
+    if len(data) > MAX_UPLOAD_BYTES:
+        return f"larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+    
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        return too_many_pixels
+    except OSError:
+        return "not a readable image"
+    
+    if width * height > MAX_UPLOAD_PIXELS:
+        return too_many_pixels
+    return None
+
+def load_image(data):
+    """Open image bytes and decode the pixels now, not lazily on first use"""
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+# Functions defined in this script are recreated on every rerun, which would empty an lru_cache,
+# so decoded images use st.cache_resource - it survives reruns and hands back the same object.
+# It is shared by all sessions, so entries expire rather than outliving the tabs that made them
+@st.cache_resource(max_entries=6, ttl=DECODE_CACHE_TTL, show_spinner=False)
+def decode_image(data):
+    """Decode uploaded file bytes to an RGB image (only the most recent few stay in memory)"""
+    return convert_to_rgb(load_image(data))
+
+def get_edited_image(idx):
+    """Current version of an uploaded image - the decoded original until an edit is saved"""
+    edited = st.session_state.edited_images[idx]
+    return edited if edited is not None else decode_image(st.session_state.original_bytes[idx])
+
 def apply_basic_adjustments(image, brightness=1.0, contrast=1.0, saturation=1.0, sharpness=1.0):
     """Apply basic photo adjustments"""
+    # Slider steps are float arithmetic in the browser, so snap off jitter like 1.0000000000000002
+    # before comparing against 1.0
+    brightness, contrast, saturation, sharpness = (
+        round(value, 6) for value in (brightness, contrast, saturation, sharpness)
+    )
+    
+    # Nothing to do with default sliders - skip the enhancer passes entirely
+    if brightness == contrast == saturation == sharpness == 1.0:
+        return image
+    
     if brightness != 1.0:
         enhancer = ImageEnhance.Brightness(image)
         image = enhancer.enhance(brightness)
@@ -180,31 +290,68 @@ def apply_basic_adjustments(image, brightness=1.0, contrast=1.0, saturation=1.0,
 
 def apply_noise_reduction(image, strength=1):
     """Apply noise reduction filter"""
+    if cv2 is not None and strength > 0:
+        # Same 3x3 median passes as the PIL path, but with OpenCV's SIMD median
+        arr = np.asarray(convert_to_rgb(image))
+        for _ in range(strength):
+            arr = cv2.medianBlur(arr, 3)
+        return Image.fromarray(arr)
+    
+    # Fallback when OpenCV isn't installed
     for _ in range(strength):
         image = image.filter(ImageFilter.MedianFilter(size=3))
     return image
 
-def crop_image(image, ratio):
-    """Crop image to specified ratio"""
+def crop_box(size, ratio):
+    """Centered (left, top, right, bottom) box for cropping an image of the given size to a ratio"""
+    width, height = size
     if ratio is None:
-        return image
+        return (0, 0, width, height)
     
-    width, height = image.size
     target_ratio = ratio[0] / ratio[1]
     current_ratio = width / height
     
     if current_ratio > target_ratio:
         new_width = int(height * target_ratio)
         left = (width - new_width) // 2
-        image = image.crop((left, 0, left + new_width, height))
+        return (left, 0, left + new_width, height)
     else:
         new_height = int(width / target_ratio)
         top = (height - new_height) // 2
-        image = image.crop((0, top, width, top + new_height))
+        return (0, top, width, top + new_height)
+
+def crop_image(image, ratio):
+    """Crop image to specified ratio"""
+    if ratio is None:
+        return image
     
-    return image
+    return image.crop(crop_box(image.size, ratio))
+
+# Filter for the Resize slider - bicubic enlarges several times faster than Lanczos and looks
+# the same at these ratios (it also matches the rotate warp); upscale_image keeps Lanczos
+RESIZE_FILTER = Image.Resampling.BICUBIC
+
+def resize_to(image, size, resample=Image.Resampling.LANCZOS, box=None):
+    """High-quality resize with a PIL filter (of just the box region, if given), using OpenCV when available"""
+    if cv2 is None or image.mode not in ('RGB', 'L'):
+        return image.resize(size, resample, box=box)
+    
+    arr = np.asarray(image)
+    if box is not None:
+        # An array view, so the cropped region is never copied out on its own
+        left, top, right, bottom = box
+        arr = arr[top:bottom, left:right]
+    
+    # Area averaging for shrinking, since cv2's Lanczos and bicubic don't antialias
+    if size[0] <= arr.shape[1]:
+        interpolation = cv2.INTER_AREA
+    elif resample == Image.Resampling.BICUBIC:
+        interpolation = cv2.INTER_CUBIC
+    else:
+        interpolation = cv2.INTER_LANCZOS4
+    return Image.fromarray(cv2.resize(arr, size, interpolation=interpolation))
 
-def resize_image(image, scale_percent):
+def resize_image(image, scale_percent, resample=RESIZE_FILTER):
     """Resize image by percentage"""
     if scale_percent == 100:
         return image
@@ -212,158 +359,228 @@ def resize_image(image, scale_percent):
     width, height = image.size
     new_width = int(width * scale_percent / 100)
     new_height = int(height * scale_percent / 100)
-    return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    return resize_to(image, (new_width, new_height), resample)
+
+def crop_and_resize(image, ratio, scale_percent, resample=RESIZE_FILTER):
+    """Crop image to a ratio and resize it by percentage in one resampling pass"""
+    left, top, right, bottom = crop_box(image.size, ratio)
+    new_width = int((right - left) * scale_percent / 100)
+    new_height = int((bottom - top) * scale_percent / 100)
+    return resize_to(image, (new_width, new_height), resample, box=(left, top, right, bottom))
 
 def rotate_image(image, angle):
     """Rotate image by angle"""
     if angle == 0:
         return image
-    return image.rotate(-angle, expand=True, fillcolor='white')
+    # Bicubic, like the OpenCV warp in apply_transform
+    return image.rotate(-angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor='white')
 
-def check_rembg_available():
-    """Check if rembg is installed"""
-    try:
-        import rembg
-        return True
-    except ImportError:
-        return False
+def rotated_size(size, angle):
+    """Canvas size of a rotate(-angle, expand=True), computed exactly as PIL does"""
+    width, height = size
+    radians = -math.radians(-angle % 360)
+    cos, sin = round(math.cos(radians), 15), round(math.sin(radians), 15)
+    
+    # PIL rotates the corners about the center and rounds the bounding box outwards
+    xs, ys = [], []
+    for x, y in ((0, 0), (width, 0), (width, height), (0, height)):
+        x, y = x - width / 2, y - height / 2
+        xs.append(cos * x + sin * y + width / 2)
+        ys.append(-sin * x + cos * y + height / 2)
+    return (math.ceil(max(xs)) - math.floor(min(xs)), math.ceil(max(ys)) - math.floor(min(ys)))
+
+def apply_transform(image, crop_ratio, rotate_angle, resize_percent):
+    """Apply crop, rotation and resize (returns the image untouched if nothing changes)"""
+    if crop_ratio is None and rotate_angle == 0 and resize_percent == 100:
+        return image
+    
+    # Without rotation, crop and resize are a single resample of the crop box
+    if rotate_angle == 0 and resize_percent != 100:
+        return crop_and_resize(image, crop_ratio, resize_percent)
+    
+    # Quarter turns are an exact pixel transpose in PIL's rotate (no interpolation), so the
+    # warp is only worth it for other angles
+    if cv2 is None or image.mode not in ('RGB', 'L') or rotate_angle % 90 == 0:
+        image = crop_image(image, crop_ratio)
+        # Shrink before a quarter turn so it has fewer pixels to move - the size comes out the same
+        if resize_percent < 100 and rotate_angle % 90 == 0:
+            return rotate_image(resize_image(image, resize_percent), rotate_angle)
+        image = rotate_image(image, rotate_angle)
+        return resize_image(image, resize_percent)
+    
+    # Crop as an array view, then rotate and scale with a single affine warp
+    left, top, right, bottom = crop_box(image.size, crop_ratio)
+    arr = np.asarray(image)[top:bottom, left:right]
+    scale = resize_percent / 100
+    
+    # Same canvas as rotating the crop with expand=True and then resizing it
+    new_width, new_height = rotated_size((right - left, bottom - top), rotate_angle)
+    if resize_percent != 100:
+        new_width, new_height = int(new_width * scale), int(new_height * scale)
+    
+    # A warp doesn't antialias, so shrink with area averaging first and only rotate in the warp
+    if scale < 1:
+        size = (int(arr.shape[1] * scale), int(arr.shape[0] * scale))
+        arr = cv2.resize(arr, size, interpolation=cv2.INTER_AREA)
+        scale = 1.0
+    
+    # Rotate about the pixel-center midpoint and move it to the middle of the new canvas
+    height, width = arr.shape[:2]
+    matrix = cv2.getRotationMatrix2D(((width - 1) / 2, (height - 1) / 2), -rotate_angle, scale)
+    matrix[0, 2] += (new_width - width) / 2
+    matrix[1, 2] += (new_height - height) / 2
+    
+    border = (255, 255, 255) if arr.ndim == 3 else 255
+    out = cv2.warpAffine(
+        arr, matrix, (new_width, new_height),
+        flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_CONSTANT, borderValue=border
+    )
+    return Image.fromarray(out)
 
-def upscale_image(image, factor=2):
+def upscale_image(image, factor=2, resample=Image.Resampling.LANCZOS):
     """Simple upscaling (placeholder - in production use AI upscaler)"""
     width, height = image.size
     new_size = (width * factor, height * factor)
-    return image.resize(new_size, Image.Resampling.LANCZOS)
+    return resize_to(image, new_size, resample)
 
-def generate_image_variation(image, style_name, variation_prompt, enhancements=None, custom_background=None, preserve_age=True, target_age=None, detected_age=None):
-    """Generate style variation using Gemini 2.5 Flash Image (Nano Banana)"""
-    api_key = os.getenv("GOOGLE_API_KEY") or st.secrets.get("GOOGLE_API_KEY", None)
+# Longest side of images sent to and requested from Gemini - a portrait needs no more,
+# and smaller images go out and come back faster
+API_MAX_SIDE = 1024
+
+# Placeholder left in prompts by build_prompt; filled per image with the detected age
+AGE_PLACEHOLDER = "{detected_age}"
+
+def build_prompt(style_name, variation_prompt, enhancements=None, preserve_age=True, target_age=None, has_custom_background=False, has_model_photo=False):
+    """Build the generation prompt for a style variation (shared by every image)"""
+    enhancement_text = ""
+    if enhancements:
+        clauses = [
+            clause.get(value) if isinstance(clause, dict) else clause
+            for key, clause in ENHANCEMENT_CLAUSES.items()
+            if (value := enhancements.get(key))
+        ]
+        clauses = [clause for clause in clauses if clause]
+        if clauses:
+            enhancement_text = f" IMPORTANT ENHANCEMENTS: {', '.join(clauses)}."
     
-    if not api_key:
-        st.error("⚠️ Google API key not found.")
+    # Age transformation handling (detected age differs per image, filled in later)
+    age_text = ""
+    if preserve_age:
+        age_text = AGE_PLACEHOLDER
+    elif target_age and target_age != "Same Age (No Change)":
+        age_map = {
+            "Child (5-12 years)": "Transform the person to appear as a child (5-12 years old) with youthful, childlike features and smooth skin",
+            "Teenager (13-19 years)": "Transform the person to appear as a teenager (13-19 years old) with adolescent features and youthful appearance",
+            "Young Adult (20-30 years)": "Transform the person to appear as a young adult (20-30 years old) with mature but youthful features",
+            "Adult (31-45 years)": "Transform the person to appear as an adult (31-45 years old) with fully mature features",
+            "Middle Age (46-60 years)": "Transform the person to appear middle-aged (46-60 years old) with some visible aging signs",
+            "Senior (61-75 years)": "Transform the person to appear as a senior (61-75 years old) with clear aging signs and grey hair",
+            "Elderly (76+ years)": "Transform the person to appear elderly (76+ years old) with pronounced aging features and white hair"
+        }
+        if target_age in age_map:
+            age_text = f" {age_map[target_age]}."
+    
+    framing_text = ""
+    if style_name == "professional":
+        framing_text = " Frame from head to chest (professional headshot). Include shoulders and upper chest."
+    elif style_name == "passport":
+        framing_text = " Passport photo format: head and top of shoulders only, face centered, neutral expression, plain background."
+    
+    # Cap the output size - larger images only slow down the response and decoding
+    size_text = f" Output image at most {API_MAX_SIDE} pixels on the longest side."
+    
+    model_photo_text = ""
+    if has_model_photo:
+        model_photo_text = " Match the style, lighting, color grading, and overall aesthetic of the reference model photo provided."
+    
+    # Custom background handling
+    if has_custom_background:
+        background_text = " Replace the background with the environment from the custom background image provided."
+        return f"Transform this photo: {variation_prompt}.{framing_text}{age_text}{enhancement_text}{background_text}{model_photo_text} Keep changes natural and subtle. Generate high-quality image.{size_text}"
+    
+    return f"Transform this photo: {variation_prompt}.{framing_text}{age_text}{enhancement_text}{model_photo_text} Keep changes subtle and natural. Generate high-quality image.{size_text}"
+
+# Safety settings shared by all Gemini requests
+GEMINI_SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_ONLY_HIGH"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"}
+]
+
+def image_part(image):
+    """Image as an inline JPEG part for a Gemini request"""
+    # Passing the PIL image lets the SDK re-encode it as lossless WebP - far slower and larger
+    return {'mime_type': 'image/jpeg', 'data': encode_baseline_jpeg(image, 90)}
+
+@st.cache_resource(show_spinner=False)
+def get_gemini_model(api_key):
+    """Configure the Gemini client and build the model once per API key instead of on every call"""
+    # The SDK pulls in gRPC and protobuf - nearly a second of imports - so it is loaded on first
+    # use rather than holding up the login page and first render
+    import google.generativeai as genai
+    from google.generativeai import client as genai_client
+    
+    genai.configure(api_key=api_key)
+    
+    # Models create the shared gRPC client lazily on their first request; create it here so
+    # concurrent generation workers reuse one connection instead of each opening their own
+    genai_client.get_default_generative_client()
+    return genai.GenerativeModel('gemini-2.5-flash-image-preview')
+
+# Seconds to wait before each retry of a rate-limited request
+RATE_LIMIT_BACKOFF = (1, 2, 4)
+
+def is_rate_limited(error):
+    """Whether an API error is a 429 / quota error"""
+    error_msg = str(error)
+    return '429' in error_msg or 'quota' in error_msg.lower()
+
+def generate_content(model, content_parts):
+    """Send a Gemini request, retrying with exponential backoff while it is rate limited"""
+    for delay in RATE_LIMIT_BACKOFF:
+        try:
+            return model.generate_content(content_parts, safety_settings=GEMINI_SAFETY_SETTINGS)
+        except Exception as e:
+            if not is_rate_limited(e):
+                raise
+        # Jitter so concurrent workers that hit the limit together don't retry in lockstep
+        time.sleep(delay * random.uniform(1, 1.5))
+    return model.generate_content(content_parts, safety_settings=GEMINI_SAFETY_SETTINGS)
+
+def get_api_key():
+    """Google API key from the environment or Streamlit secrets, None if not configured"""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if api_key:
+        return api_key
+    
+    # st.secrets raises instead of returning the default when there is no secrets.toml at all
+    try:
+        return st.secrets.get("GOOGLE_API_KEY", None)
+    except (StreamlitSecretNotFoundError, FileNotFoundError):
         return None
+
+def generate_from_prompt(model, image, prompt, detected_age=None, custom_background=None, model_photo=None):
+    """Generate style variation from a prebuilt prompt using Gemini 2.5 Flash Image (Nano Banana), returns (image, notices)"""
+    # Runs on a worker thread, so messages come back as (level, text) notices for the
+    # script thread to show instead of being written to the page from here
+    notices = []
     
     try:
-        # Configure the API
-        genai.configure(api_key=api_key)
-        
-        enhancement_text = ""
-        if enhancements:
-            enhancements_list = []
-            if enhancements.get('hair'):
-                enhancements_list.append("subtle hair enhancement, slightly fill in any thinning areas naturally, maintain original hairstyle and volume, keep it realistic and close to original appearance")
-            if enhancements.get('remove_grey_hair'):
-                enhancements_list.append("restore natural hair color by removing all grey/white hair, convert grey hair to natural darker color that matches the person's original hair color, maintain realistic hair texture and appearance, keep hairstyle unchanged")
-            if enhancements.get('skin'):
-                enhancements_list.append("smooth flawless skin, reduced wrinkles and fine lines, even skin tone, no blemishes or imperfections")
-            
-            # Skin tone adjustment
-            skin_tone = enhancements.get('skin_tone', 'Natural')
-            if skin_tone != 'Natural':
-                tone_map = {
-                    'Much Darker': 'deeper, richer skin tone with warm undertones, naturally darker complexion',
-                    'Darker': 'slightly deeper skin tone, subtly darker complexion maintaining natural look',
-                    'Lighter': 'slightly lighter skin tone, subtly brighter complexion maintaining natural look',
-                    'Much Lighter': 'lighter, brighter skin tone with luminous quality, naturally lighter complexion'
-                }
-                enhancements_list.append(f"adjust skin tone: {tone_map[skin_tone]}, ensure natural appearance and avoid unrealistic changes")
-            
-            if enhancements.get('teeth'):
-                enhancements_list.append("bright white teeth, perfect smile, dental enhancement")
-            if enhancements.get('eyes'):
-                enhancements_list.append("bright clear eyes, enhanced eye color, sparkle and clarity, well-defined features")
-            if enhancements.get('lighting'):
-                enhancements_list.append("professional studio lighting, perfect illumination, flattering light setup")
-            if enhancements.get('sharpness'):
-                enhancements_list.append("enhanced sharpness and clarity, crisp details, high definition quality")
-            
-            if enhancements_list:
-                enhancement_text = f" IMPORTANT ENHANCEMENTS: {', '.join(enhancements_list)}."
-        
-        # Age transformation handling
+        # Fill in the per-image age (only present when preserving age)
         age_text = ""
-        if preserve_age and detected_age:
+        if detected_age:
             age_text = f" The person should appear to be approximately {detected_age} years old, maintaining the same age appearance as in the original photo."
-        elif not preserve_age and target_age and target_age != "Same Age (No Change)":
-            age_map = {
-                "Child (5-12 years)": "Transform the person to appear as a child (5-12 years old) with youthful, childlike features and smooth skin",
-                "Teenager (13-19 years)": "Transform the person to appear as a teenager (13-19 years old) with adolescent features and youthful appearance",
-                "Young Adult (20-30 years)": "Transform the person to appear as a young adult (20-30 years old) with mature but youthful features",
-                "Adult (31-45 years)": "Transform the person to appear as an adult (31-45 years old) with fully mature features",
-                "Middle Age (46-60 years)": "Transform the person to appear middle-aged (46-60 years old) with some visible aging signs",
-                "Senior (61-75 years)": "Transform the person to appear as a senior (61-75 years old) with clear aging signs and grey hair",
-                "Elderly (76+ years)": "Transform the person to appear elderly (76+ years old) with pronounced aging features and white hair"
-            }
-            if target_age in age_map:
-                age_text = f" {age_map[target_age]}."
-        
-        framing_text = ""
-        if style_name == "professional":
-            framing_text = " Frame from head to chest (professional headshot). Include shoulders and upper chest."
-        elif style_name == "passport":
-            framing_text = " Passport photo format: head and top of shoulders only, face centered, neutral expression, plain background."
-        
-        # Custom background handling
-        background_text = ""
+        prompt = prompt.replace(AGE_PLACEHOLDER, age_text)
+        
+        # Generate content with images (include background and model photo if available)
+        content_parts = [prompt, image_part(image)]
         if custom_background is not None:
-            background_text = " Replace the background with the environment from the custom background image provided."
-            
-            # Check if model photo is provided
-            model_photo_text = ""
-            has_model_photo = st.session_state.model_photo is not None
-            
-            if has_model_photo:
-                model_photo_text = " Match the style, lighting, color grading, and overall aesthetic of the reference model photo provided."
-            
-            # Create prompt with custom background
-            prompt = f"Transform this photo: {variation_prompt}.{framing_text}{age_text}{enhancement_text}{background_text}{model_photo_text} Keep changes natural and subtle. Generate high-quality image."
-            
-            # Create model instance
-            model = genai.GenerativeModel('gemini-2.5-flash-image-preview')
-            
-            # Configure safety settings
-            safety_settings = [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"}
-            ]
-            
-            # Generate content with images (include model photo if available)
-            content_parts = [prompt, image, "Custom background reference:", custom_background]
-            if has_model_photo:
-                content_parts.extend(["Style reference (model photo):", st.session_state.model_photo])
-            
-            response = model.generate_content(
-                content_parts,
-                safety_settings=safety_settings
-            )
-        else:
-            # Check if model photo is provided
-            model_photo_text = ""
-            has_model_photo = st.session_state.model_photo is not None
-            
-            if has_model_photo:
-                model_photo_text = " Match the style, lighting, color grading, and overall aesthetic of the reference model photo provided."
-            
-            prompt = f"Transform this photo: {variation_prompt}.{framing_text}{age_text}{enhancement_text}{model_photo_text} Keep changes subtle and natural. Generate high-quality image."
-            
-            # Create model instance
-            model = genai.GenerativeModel('gemini-2.5-flash-image-preview')
-            
-            # Configure safety settings
-            safety_settings = [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_ONLY_HIGH"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"}
-            ]
-            
-            # Generate content (include model photo if available)
-            content_parts = [prompt, image]
-            if has_model_photo:
-                content_parts.extend(["Style reference (model photo):", st.session_state.model_photo])
-            
-            response = model.generate_content(content_parts, safety_settings=safety_settings)
+            content_parts.extend(["Custom background reference:", image_part(custom_background)])
+        if model_photo is not None:
+            content_parts.extend(["Style reference (model photo):", image_part(model_photo)])
+        
+        response = generate_content(model, content_parts)
         
         # Check for generated image in response
         if hasattr(response, 'parts') and response.parts:
@@ -371,10 +588,11 @@ def generate_image_variation(image, style_name, variation_prompt, enhancements=N
                 if hasattr(part, 'inline_data') and part.inline_data:
                     # Extract the generated image
                     image_data = part.inline_data.data
-                    processed_image = Image.open(io.BytesIO(image_data))
+                    # Decoded here in the worker thread, not later while the page renders
+                    processed_image = load_image(image_data)
                     # Convert to RGB to avoid RGBA/JPEG issues
                     processed_image = convert_to_rgb(processed_image)
-                    return processed_image
+                    return processed_image, notices
         
         # Safe text response handling
         try:
@@ -383,75 +601,203 @@ def generate_image_variation(image, style_name, variation_prompt, enhancements=N
                 if hasattr(candidate, 'content') and candidate.content.parts:
                     for part in candidate.content.parts:
                         if hasattr(part, 'text'):
-                            st.caption(f"AI Response: {part.text[:150]}...")
+                            notices.append(('caption', f"AI Response: {part.text[:150]}..."))
                             break
                 elif hasattr(candidate, 'finish_reason'):
-                    st.warning(f"⚠️ Generation blocked. Reason: {candidate.finish_reason}")
+                    notices.append(('warning', f"⚠️ Generation blocked. Reason: {candidate.finish_reason}"))
         except Exception as e:
-            st.warning(f"⚠️ Could not process response: {str(e)}")
+            notices.append(('warning', f"⚠️ Could not process response: {str(e)}"))
         
         # Fallback: return original
-        st.warning("⚠️ No image generated. Returning original photo.")
-        return image
+        notices.append(('warning', "⚠️ No image generated. Returning original photo."))
+        return image, notices
         
     except Exception as e:
         error_msg = str(e)
         
         # Handle specific errors
-        if '429' in error_msg or 'quota' in error_msg.lower():
-            st.error("⚠️ API quota exceeded. Please wait a moment and try again.")
+        if is_rate_limited(e):
+            notices.append(('error', "⚠️ API quota exceeded. Please wait a moment and try again."))
         elif '404' in error_msg or 'not found' in error_msg.lower():
-            st.error("⚠️ Model 'gemini-2.5-flash-image-preview' not found. This model may not be available yet.")
-            st.info("💡 Try updating: pip install --upgrade google-generativeai")
+            notices.append(('error', "⚠️ Model 'gemini-2.5-flash-image-preview' not found. This model may not be available yet."))
+            notices.append(('info', "💡 Try updating: pip install --upgrade google-generativeai"))
         else:
-            st.error(f"❌ Error: {error_msg[:200]}")
+            notices.append(('error', f"❌ Error: {error_msg[:200]}"))
         
-        return image
+        return image, notices
+
+# Gemini calls are network-bound, so several can be in flight at once
+GENERATION_WORKERS = 8
+
+# Most generation results remembered per session for identical requests
+GENERATION_MEMO_SIZE = 200
+
+def image_digest(image):
+    """Content hash of an image's pixels, None for no image"""
+    if image is None:
+        return None
+    return hashlib.md5(image.tobytes()).digest()
+
+def generate_variations(tasks, custom_background=None, model_photo=None, on_progress=None, refresh=False):
+    """Run (key, image, prompt, detected_age) generation tasks concurrently, returns {key: JPEG bytes} in task order"""
+    # Without a key every request would fail, so skip the hashing, encoding and worker threads
+    api_key = get_api_key()
+    if not api_key:
+        st.error("⚠️ Google API key not found.")
+        return {}
+    
+    # The shared model is looked up here on the script thread and handed to the workers
+    try:
+        model = get_gemini_model(api_key)
+    except Exception as e:
+        st.error(f"❌ Error: {str(e)[:200]}")
+        return {}
+    
+    results = {}
+    notices = []
+    
+    # Reference photos are capped to the same size as the photos being styled
+    if custom_background is not None:
+        custom_background = api_image(custom_background)
+    if model_photo is not None:
+        model_photo = api_image(model_photo)
+    
+    # Identical requests (same pixels, prompt, age and references) reuse the earlier result,
+    # unless refresh asks for new images
+    memo = st.session_state.setdefault('generation_memo', {})
+    references = (image_digest(custom_background), image_digest(model_photo))
+    memo_keys = {
+        key: (image_digest(image), prompt, detected_age) + references
+        for key, image, prompt, detected_age in tasks
+    }
+    
+    # Requests still running from an interrupted earlier run, as memo key -> future
+    pending = st.session_state.setdefault('generation_pending', {})
+    
+    def generate_jpeg(key, image, prompt, detected_age):
+        # Results are kept as JPEG bytes, a fraction of the pixels, and encoded here in the
+        # worker with the key's chroma subsampling so downloads can serve them as they are
+        generated, notices = generate_from_prompt(model, image, prompt, detected_age, custom_background, model_photo)
+        data = encode_jpeg(generated, quality=95, subsampling=jpeg_subsampling(key))
+        return data, generated is image, notices
+    
+    def remember(future, memo_key):
+        # Runs in the worker when a request finishes, even if a rerun has stopped the script
+        # run that started it, so only the captured dicts are touched
+        # The result goes into the memo before the request leaves pending, so a concurrent run
+        # always finds it in one or the other
+        try:
+            data, failed, _ = future.result()
+            # Failures hand back the input photo, which is not worth remembering
+            if not failed:
+                memo[memo_key] = data
+        finally:
+            if pending.get(memo_key) is future:
+                pending.pop(memo_key, None)
+    
+    # Workers never touch st - they can outlive this run, so their messages come back as notices
+    executor = ThreadPoolExecutor(max_workers=GENERATION_WORKERS)
+    
+    # One request per photo and variation, all in flight together
+    jobs = {}
+    for key, image, prompt, detected_age in tasks:
+        memo_key = memo_keys[key]
+        if not refresh and memo_key in memo:
+            results[key] = memo[memo_key]
+        elif not refresh and memo_key in pending:
+            jobs[key] = pending[memo_key]
+        else:
+            future = executor.submit(generate_jpeg, key, image, prompt, detected_age)
+            jobs[key] = pending[memo_key] = future
+            future.add_done_callback(functools.partial(remember, memo_key=memo_key))
+    
+    # Don't block on shutdown - if a widget interaction stops this run, the requests still
+    # finish in the background and the next run picks them up instead of sending them again
+    executor.shutdown(wait=False)
+    
+    waiting = {}
+    for key, future in jobs.items():
+        waiting.setdefault(future, []).append(key)
+    
+    done = len(results)
+    for future in as_completed(waiting):
+        data, _, task_notices = future.result()
+        notices.extend(task_notices)
+        for key in waiting[future]:
+            results[key] = data
+            done += 1
+        if on_progress:
+            on_progress(done, len(tasks))
+    
+    # Shown here on the script thread, once each - a worker that outlives this run must not
+    # write into the page of the next one
+    for level, message in dict.fromkeys(notices):
+        getattr(st, level)(message)
+    
+    for old_key in list(memo)[:-GENERATION_MEMO_SIZE]:
+        memo.pop(old_key, None)
+    
+    # Keep the grid in image/variation order, not completion order
+    return {key: results[key] for key, *_ in tasks if key in results}
+
+def generate_selected_variations(style_name, variations, preserve_age, target_age, status_label, refresh=False):
+    """Generate every selected variation for every photo behind a progress bar, returns {key: JPEG bytes}"""
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    
+    # Prompts only depend on the variation, so build them once for all images
+    prompts = {
+        var_name: build_prompt(
+            style_name,
+            variations[var_name],
+            st.session_state.enhancements,
+            preserve_age,
+            target_age,
+            has_custom_background=st.session_state.custom_background is not None,
+            has_model_photo=st.session_state.model_photo is not None
+        )
+        for var_name in st.session_state.selected_samples
+        if var_name in variations
+    }
+    
+    tasks = [
+        (f"img{img_idx+1}_{var_name}", image, prompts[var_name], st.session_state.detected_ages.get(img_idx))
+        for img_idx, image in enumerate(get_api_images())
+        for var_name in st.session_state.selected_samples
+        if var_name in prompts
+    ]
+    status_text.text(f"{status_label} {len(tasks)} variations...")
+    
+    generated = generate_variations(
+        tasks,
+        st.session_state.custom_background,
+        st.session_state.model_photo,
+        on_progress=lambda done, total: progress_bar.progress(done / total, text=f"{done}/{total} done"),
+        refresh=refresh
+    )
+    
+    status_text.empty()
+    progress_bar.empty()
+    return generated
 
 def detect_age_from_image(image):
     """Detect approximate age from image using Gemini Vision"""
     try:
         # Use the same API key as image generation
-        api_key = os.getenv("GOOGLE_API_KEY") or st.secrets.get("GOOGLE_API_KEY", None)
+        api_key = get_api_key()
         if not api_key:
             st.warning("⚠️ Google API key not found for age detection")
             return None
         
-        genai.configure(api_key=api_key)
-        
-        # Convert PIL Image to bytes
-        img_byte_arr = io.BytesIO()
-        
-        # Convert to RGB for JPEG compatibility
-        image = convert_to_rgb(image)
-        
-        image.save(img_byte_arr, format='JPEG')
-        img_byte_arr.seek(0)
-        
-        # Create model instance
-        model = genai.GenerativeModel('gemini-2.5-flash-image-preview')
+        model = get_gemini_model(api_key)
         
         prompt = """Analyze this photo and estimate the person's age. Respond with ONLY a number representing the estimated age in years. 
         For example, if the person appears to be in their early 30s, respond with just: 32
         If there are multiple people, estimate the age of the primary/central person.
         Be as accurate as possible based on facial features, skin texture, and overall appearance."""
         
-        # Upload image
-        uploaded_file = genai.upload_file(img_byte_arr, mime_type="image/jpeg")
-        
-        # Configure safety settings
-        safety_settings = [
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
-            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_ONLY_HIGH"},
-            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"}
-        ]
-        
-        # Generate response
-        response = model.generate_content([prompt, uploaded_file], safety_settings=safety_settings)
-        
-        # Clean up uploaded file
-        genai.delete_file(uploaded_file.name)
+        # Send the image inline with the request - no separate file upload and delete round trips
+        response = generate_content(model, [prompt, image_part(image)])
         
         # Safely extract age from response
         try:
@@ -475,6 +821,24 @@ def detect_age_from_image(image):
         st.warning(f"Could not detect age: {str(e)}")
         return None
 
+def detect_ages(images):
+    """Detect ages for {index: image} concurrently, returns {index: age} for the ones detected"""
+    if not images:
+        return {}
+    if not get_api_key():
+        st.warning("⚠️ Google API key not found for age detection")
+        return {}
+    
+    ctx = get_script_run_ctx()
+    
+    # One request per photo, all in flight together like generation
+    with ThreadPoolExecutor(
+        max_workers=GENERATION_WORKERS,
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    ) as executor:
+        ages = executor.map(detect_age_from_image, images.values())
+        return {idx: age for idx, age in zip(images, ages) if age}
+
 def get_age_range(age):
     """Convert age to age range category"""
     if age is None:
@@ -497,26 +861,202 @@ def get_age_range(age):
     else:
         return "Elderly (76+ years)"
 
-def create_zip_file(images_dict):
-    """Create ZIP file with all images"""
+def jpeg_subsampling(name):
+    """Chroma subsampling for a generated image key - 4:4:4 for passport styles, 4:2:0 otherwise"""
+    variation = name.split('_', 1)[-1]
+    return 0 if variation in FULL_CHROMA_VARIATIONS else 2
+
+def encode_jpegli(image, quality, subsampling=2):
+    """Encode image with the cjpegli CLI, returns None if the encoder fails"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        src_path = os.path.join(tmp_dir, 'input.ppm')
+        dst_path = os.path.join(tmp_dir, 'output.jpg')
+        image.save(src_path, format='PPM')
+        
+        chroma = {0: '444', 1: '422', 2: '420'}[subsampling]
+        result = subprocess.run(
+            [CJPEGLI_PATH, src_path, dst_path, '-q', str(quality), f"--chroma_subsampling={chroma}"],
+            capture_output=True
+        )
+        if result.returncode != 0:
+            return None
+        
+        with open(dst_path, 'rb') as f:
+            return f.read()
+
+def encode_turbojpeg(image, quality, subsampling=2, progressive=False):
+    """Encode an RGB or L image with libjpeg-turbo"""
+    flags = TJFLAG_PROGRESSIVE if progressive else 0
+    if image.mode == 'L':
+        return turbo_jpeg.encode(
+            np.asarray(image), quality=quality,
+            pixel_format=TJPF_GRAY, jpeg_subsample=TJSAMP_GRAY, flags=flags
+        )
+    
+    # TurboJPEG's TJSAMP_444/422/420 use the same 0/1/2 numbering as Pillow
+    return turbo_jpeg.encode(
+        np.asarray(image), quality=quality,
+        pixel_format=TJPF_RGB, jpeg_subsample=subsampling, flags=flags
+    )
+
+def encode_jpeg(image, quality=85, subsampling=2):
+    """Encode image as an optimized progressive JPEG"""
+    # Convert to RGB for JPEG compatibility
+    image = convert_to_rgb(image)
+    
+    if CJPEGLI_PATH:
+        data = encode_jpegli(image, quality, subsampling)
+        if data:
+            return data
+    
+    if turbo_jpeg is not None:
+        return encode_turbojpeg(image, quality, subsampling, progressive=True)
+    
+    img_buffer = io.BytesIO()
+    image.save(
+        img_buffer, format='JPEG', quality=quality,
+        optimize=True, progressive=True, subsampling=subsampling
+    )
+    return img_buffer.getvalue()
+
+def encode_baseline_jpeg(image, quality):
+    """Encode image as a plain baseline JPEG, favouring speed over size"""
+    # Convert to RGB for JPEG compatibility
+    image = convert_to_rgb(image)
+    
+    if turbo_jpeg is not None:
+        return encode_turbojpeg(image, quality)
+    
+    img_buffer = io.BytesIO()
+    image.save(img_buffer, format='JPEG', quality=quality)
+    return img_buffer.getvalue()
+
+def encode_zip_entry(name, image):
+    """Encode one (name, image) pair as a ZIP entry name and JPEG bytes - image may be JPEG bytes or a loader"""
+    safe_name = name.replace(' ', '_').replace('/', '_')
+    if isinstance(image, bytes):
+        # Already encoded, like generated results - stored as they are
+        return f"{safe_name}.jpg", image
+    if callable(image):
+        # Decoded here in the worker, so only the encoded entries are held at once
+        image = convert_to_rgb(image())
+    return f"{safe_name}.jpg", encode_baseline_jpeg(image, 95)
+
+def cache_per_image(cache_name, image, variant, build, max_entries):
+    """Result of build(image) kept per image object in session state (oldest entries dropped past max_entries)"""
+    cache = st.session_state.setdefault(cache_name, {})
+    key = (id(image), variant)
+    
+    # Keyed on identity so a rerun is a dict lookup instead of hashing the pixels;
+    # the weak reference guards against a reused id without keeping the image alive
+    entry = cache.get(key)
+    if entry is not None and entry[0]() is image:
+        return entry[1]
+    
+    result = build(image)
+    cache[key] = (weakref.ref(image), result)
+    while len(cache) > max_entries:
+        cache.pop(next(iter(cache)), None)
+    return result
+
+# Full-resolution edit previews kept so Save/Apply reuses them instead of recomputing
+EDIT_CACHE_SIZE = 4
+
+# Widest image sent to the browser for on-screen previews
+PREVIEW_MAX_WIDTH = 1024
+
+def encode_preview(image):
+    """Downscale image to the preview width and encode it as JPEG"""
+    if image.width > PREVIEW_MAX_WIDTH:
+        image = resize_to(image, (PREVIEW_MAX_WIDTH, max(1, round(image.height * PREVIEW_MAX_WIDTH / image.width))))
+    return encode_baseline_jpeg(image, 85)
+
+def preview_image(image):
+    """Preview JPEG bytes for st.image, made once per image object"""
+    # Encoded bytes are served as-is - given a PIL image, st.image would re-encode it on every rerun
+    return cache_per_image('preview_cache', image, PREVIEW_MAX_WIDTH, encode_preview, max_entries=64)
+
+def api_size(size):
+    """(width, height) scaled so the longest side is API_MAX_SIDE"""
+    scale = API_MAX_SIDE / max(size)
+    return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+
+def api_image(image):
+    """Downscaled copy of an image for Gemini requests, made once per image object"""
+    if max(image.size) <= API_MAX_SIDE:
+        return image
+    
+    size = api_size(image.size)
+    return cache_per_image('api_image_cache', image, size, lambda img: resize_to(img, size), max_entries=32)
+
+@st.cache_resource(max_entries=16, ttl=DECODE_CACHE_TTL, show_spinner=False)
+def original_api_image(data):
+    """Gemini-sized copy of uploaded file bytes - JPEGs are scaled down while decoding"""
+    image = Image.open(io.BytesIO(data))
+    if max(image.size) <= API_MAX_SIDE:
+        return decode_image(data)
+    
+    # Same reduced-scale libjpeg decode as the previews, then resize to the exact API size
+    size = api_size(image.size)
+    image.draft('RGB', size)
+    return resize_to(convert_to_rgb(image), size)
+
+def get_api_images():
+    """Gemini-sized version of every uploaded image - unedited ones never decode at full size"""
+    return [
+        api_image(edited) if edited is not None else original_api_image(data)
+        for edited, data in zip(st.session_state.edited_images, st.session_state.original_bytes)
+    ]
+
+@st.cache_resource(max_entries=16, ttl=DECODE_CACHE_TTL, show_spinner=False)
+def original_preview(data):
+    """Preview JPEG bytes from encoded image bytes (uploads or generated results) - JPEGs are scaled down while decoding"""
+    image = Image.open(io.BytesIO(data))
+    if image.width > PREVIEW_MAX_WIDTH:
+        # draft() lets libjpeg decode at 1/2, 1/4 or 1/8 scale instead of the full resolution
+        image.draft('RGB', (PREVIEW_MAX_WIDTH, max(1, image.height * PREVIEW_MAX_WIDTH // image.width)))
+    return encode_preview(convert_to_rgb(image))
+
+def create_zip_file(images, compression=zipfile.ZIP_STORED):
+    """Create ZIP file from an iterable of (name, image, loader or JPEG bytes) pairs"""
     zip_buffer = io.BytesIO()
     
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for name, image in images_dict.items():
-            img_buffer = io.BytesIO()
-            
-            # Convert to RGB for JPEG compatibility
-            image = convert_to_rgb(image)
-            
-            image.save(img_buffer, format='JPEG', quality=95)
-            img_buffer.seek(0)
-            
-            safe_name = name.replace(' ', '_').replace('/', '_')
-            zip_file.writestr(f"{safe_name}.jpg", img_buffer.getvalue())
+    # libjpeg releases the GIL, so encode in parallel and only write the archive sequentially
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        entries = executor.map(lambda item: encode_zip_entry(*item), images)
+        
+        # Entries are JPEGs, so deflating them only burns CPU for no size gain
+        with zipfile.ZipFile(zip_buffer, 'w', compression) as zip_file:
+            for entry_name, data in entries:
+                zip_file.writestr(entry_name, data)
     
     zip_buffer.seek(0)
     return zip_buffer
 
+def get_deferred_zip(cache_name, cache_key, tracked, entries):
+    """Deferred download data for (name, image, loader or JPEG bytes) entries, reused while cache_key and its tracked images last"""
+    zip_cache = st.session_state.setdefault('zip_cache', {})
+    
+    # Weak references only - a freed image must not keep its archive, nor be kept alive by it
+    entry = zip_cache.get(cache_name)
+    if entry is not None and entry['key'] == cache_key and all(ref() is not None for ref in entry['refs']):
+        return entry['data']
+    
+    refs = [weakref.ref(image) for image in tracked]
+    
+    def build():
+        # Runs on click outside the script, so only the captured dict is touched here
+        data = create_zip_file(entries, compression=zipfile.ZIP_STORED).getvalue()
+        zip_cache[cache_name] = {'key': cache_key, 'refs': refs, 'data': data}
+        return data
+    
+    return build
+
+@st.cache_data(ttl=15, show_spinner=False)
+def load_all_users():
+    """Account info for all users, loaded in one pass and shared by the admin panel"""
+    return auth.get_all_account_info()
+
 # Header
 col_header1, col_header2 = st.columns([3, 1])
 
@@ -528,29 +1068,9 @@ with col_header1:
 with col_header2:
     st.markdown("")
     if st.button("🔄 Start Over", type="secondary", use_container_width=True):
-        # Save authentication state before clearing
-        is_authenticated = st.session_state.get('authenticated', False)
-        current_username = st.session_state.get('username', None)
-        current_login_time = st.session_state.get('login_time', None)
-        
         # Only proceed if user is authenticated
-        if is_authenticated:
-            # Clear Streamlit cache
-            st.cache_data.clear()
-            st.cache_resource.clear()
-            
-            # Clear all session state
-            st.session_state.clear()
-            
-            # Restore authentication state
-            st.session_state.authenticated = True
-            st.session_state.username = current_username
-            st.session_state.login_time = current_login_time
-            
-            # Force new uploader key
-            import time
-            st.session_state.uploader_key = int(time.time())
-            
+        if st.session_state.get('authenticated', False):
+            reset_workspace()
             st.rerun()
 
 st.markdown("---")
@@ -577,178 +1097,225 @@ with tab1:
     if uploaded_files:
         # Initialize images on first upload or when count changes
         current_count = len(uploaded_files)
-        previous_count = len(st.session_state.original_images)
+        previous_count = st.session_state.get('uploaded_count')
         
         if current_count != previous_count:
-            # Open images and convert to RGB to avoid RGBA/JPEG issues
-            st.session_state.original_images = [convert_to_rgb(Image.open(f)) for f in uploaded_files]
-            st.session_state.edited_images = [img.copy() for img in st.session_state.original_images]
-            st.session_state.working_images = [img.copy() for img in st.session_state.original_images]
+            st.session_state.uploaded_count = current_count
+            
+            # Keep the compressed file bytes and decode originals on demand; oversized files
+            # are refused from their header before anything is decoded
+            st.session_state.original_bytes = []
+            st.session_state.upload_digests = []
+            st.session_state.rejected_uploads = []
+            for f in uploaded_files:
+                data = f.getvalue()
+                problem = check_upload(data)
+                if problem:
+                    st.session_state.rejected_uploads.append(f"{f.name} ({problem})")
+                else:
+                    st.session_state.original_bytes.append(data)
+                    st.session_state.upload_digests.append(hashlib.md5(data).digest())
+            
+            # Nothing is edited yet, so unedited slots just point back at the original bytes
+            st.session_state.edited_images = [None] * len(st.session_state.original_bytes)
+            st.session_state.slider_state = {}
+            st.session_state.pop('slider_idx', None)
         
-        st.success(f"✅ {len(uploaded_files)} image(s) uploaded")
+        for rejected in st.session_state.rejected_uploads:
+            st.error(f"❌ Skipped {rejected}")
+    
+    if uploaded_files and st.session_state.original_bytes:
+        st.success(f"✅ {len(st.session_state.original_bytes)} image(s) uploaded")
         
         # Image selector for editing
-        if len(st.session_state.original_images) > 1:
+        if len(st.session_state.original_bytes) > 1:
             selected_idx = st.selectbox(
                 "Select image to edit:",
-                range(len(st.session_state.original_images)),
+                range(len(st.session_state.original_bytes)),
                 format_func=lambda x: f"Image {x+1}"
             )
         else:
             selected_idx = 0
         
         # Make sure we have a working image for the selected index
-        if selected_idx >= len(st.session_state.working_images):
+        if selected_idx >= len(st.session_state.edited_images):
             st.error("Error: Image index out of range. Please refresh the page.")
             st.stop()
         
-        current_image = st.session_state.working_images[selected_idx]
+        # The full-resolution image is only decoded when an edit actually runs
+        edited_image = st.session_state.edited_images[selected_idx]
         
         col1, col2 = st.columns([1, 2])
         
         with col1:
             st.subheader("Original")
-            st.image(st.session_state.original_images[selected_idx], use_container_width=True)
+            st.image(original_preview(st.session_state.original_bytes[selected_idx]), use_container_width=True)
         
         with col2:
             st.subheader("Live Preview (All Edits)")
             preview_placeholder = st.empty()
-            preview_placeholder.image(current_image, use_container_width=True)
+            # An unedited image looks like the original, which previews without a full decode
+            if edited_image is None:
+                preview_placeholder.image(original_preview(st.session_state.original_bytes[selected_idx]), use_container_width=True)
+            else:
+                preview_placeholder.image(preview_image(edited_image), use_container_width=True)
         
         st.markdown("---")
         
         # Editing tools in expandable sections
         with st.expander("⚙️ Basic Adjustments", expanded=True):
-            st.caption("Adjust sliders and changes apply instantly")
+            st.caption("Adjust sliders, then click Preview to see the changes")
             
-            col1, col2, col3, col4 = st.columns(4)
+            # Slider values are remembered per image, but the widgets keep stable keys
+            # so switching images doesn't remount the whole form
+            slider_state = st.session_state.setdefault('slider_state', {}).setdefault(
+                selected_idx, dict(BASIC_SLIDER_DEFAULTS)
+            )
+            if (st.session_state.get('slider_idx') != selected_idx
+                    or any(key not in st.session_state for key in BASIC_SLIDER_DEFAULTS)):
+                for key, value in slider_state.items():
+                    st.session_state[key] = value
+                st.session_state.slider_idx = selected_idx
+            
+            col_form, col_actions = st.columns([3, 1])
+            
+            with col_form:
+                # Sliders live in a form so moving them doesn't rerun the whole script
+                with st.form("basic_adjustments"):
+                    col1, col2 = st.columns(2)
+                    
+                    with col1:
+                        brightness = st.slider("💡 Brightness", 0.5, 2.0, step=0.1, key="bright")
+                        contrast = st.slider("🎭 Contrast", 0.5, 2.0, step=0.1, key="contrast")
+                    
+                    with col2:
+                        saturation = st.slider("🌈 Saturation", 0.0, 2.0, step=0.1, key="sat")
+                        sharpness = st.slider("🔪 Sharpness", 0.0, 3.0, step=0.1, key="sharp")
+                    
+                    submitted = st.form_submit_button("🔄 Preview", use_container_width=True)
             
-            with col1:
-                brightness = st.slider("💡 Brightness", 0.5, 2.0, 1.0, 0.1, key=f"bright_{selected_idx}")
-                contrast = st.slider("🎭 Contrast", 0.5, 2.0, 1.0, 0.1, key=f"contrast_{selected_idx}")
+            slider_state.update(bright=brightness, contrast=contrast, sat=saturation, sharp=sharpness)
             
-            with col2:
-                saturation = st.slider("🌈 Saturation", 0.0, 2.0, 1.0, 0.1, key=f"sat_{selected_idx}")
-                sharpness = st.slider("🔪 Sharpness", 0.0, 3.0, 1.0, 0.1, key=f"sharp_{selected_idx}")
+            if submitted:
+                st.session_state.last_preview_id = selected_idx
             
-            with col3:
-                # Apply adjustments in real-time
-                temp_image = apply_basic_adjustments(
-                    st.session_state.edited_images[selected_idx],
-                    brightness, contrast, saturation, sharpness
+            # Only run the adjustments once the user has asked for a preview of this image; the result
+            # is reused on later reruns with the same image and sliders, so saving doesn't redo it
+            if submitted or st.session_state.get('last_preview_id') == selected_idx:
+                temp_image = cache_per_image(
+                    'edit_cache', get_edited_image(selected_idx),
+                    ('adjust', brightness, contrast, saturation, sharpness),
+                    lambda img: apply_basic_adjustments(img, brightness, contrast, saturation, sharpness),
+                    max_entries=EDIT_CACHE_SIZE
                 )
-                preview_placeholder.image(temp_image, use_container_width=True)
+                preview_placeholder.image(preview_image(temp_image), use_container_width=True)
+            else:
+                temp_image = edited_image
             
-            with col4:
+            with col_actions:
                 if st.button("✅ Save Adjustments", key=f"save_basic_{selected_idx}", type="primary"):
-                    st.session_state.working_images[selected_idx] = temp_image
                     st.session_state.edited_images[selected_idx] = temp_image
+                    st.session_state.pop('last_preview_id', None)
                     st.success("✅ Saved!")
                     st.rerun()
                 
                 if st.button("↩️ Reset to Original", key=f"reset_{selected_idx}"):
-                    st.session_state.working_images[selected_idx] = st.session_state.original_images[selected_idx].copy()
-                    st.session_state.edited_images[selected_idx] = st.session_state.original_images[selected_idx].copy()
+                    st.session_state.edited_images[selected_idx] = None
+                    st.session_state.pop('last_preview_id', None)
                     st.success("↩️ Reset!")
                     st.rerun()
         
         with st.expander("✂️ Crop, Rotate & Resize"):
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                crop_preset = st.selectbox("Crop Preset", list(CROP_PRESETS.keys()), key=f"crop_{selected_idx}")
-                rotate_angle = st.slider("Rotate (degrees)", -180, 180, 0, 15, key=f"rotate_{selected_idx}")
-            
-            with col2:
-                resize_percent = st.slider("Resize (%)", 25, 200, 100, 5, key=f"resize_{selected_idx}")
-            
-            with col3:
-                if st.button("🔄 Preview Transform", key=f"preview_transform_{selected_idx}"):
-                    temp_edited = st.session_state.working_images[selected_idx].copy()
-                    
-                    # Apply crop
-                    if crop_preset != "Original":
-                        temp_edited = crop_image(temp_edited, CROP_PRESETS[crop_preset])
-                    
-                    # Apply rotation
-                    if rotate_angle != 0:
-                        temp_edited = rotate_image(temp_edited, rotate_angle)
-                    
-                    # Apply resize
-                    if resize_percent != 100:
-                        temp_edited = resize_image(temp_edited, resize_percent)
-                    
-                    preview_placeholder.image(temp_edited, use_container_width=True)
+            # Controls live in a form so changing them doesn't rerun the whole script
+            with st.form(f"transform_form_{selected_idx}"):
+                col1, col2, col3 = st.columns(3)
                 
-                if st.button("✅ Apply Transform", key=f"apply_transform_{selected_idx}", type="primary"):
-                    temp_edited = st.session_state.working_images[selected_idx].copy()
-                    
-                    # Apply crop
-                    if crop_preset != "Original":
-                        temp_edited = crop_image(temp_edited, CROP_PRESETS[crop_preset])
-                    
-                    # Apply rotation
-                    if rotate_angle != 0:
-                        temp_edited = rotate_image(temp_edited, rotate_angle)
-                    
-                    # Apply resize
-                    if resize_percent != 100:
-                        temp_edited = resize_image(temp_edited, resize_percent)
-                    
-                    st.session_state.working_images[selected_idx] = temp_edited
+                with col1:
+                    crop_preset = st.selectbox("Crop Preset", list(CROP_PRESETS.keys()), key=f"crop_{selected_idx}")
+                    rotate_angle = st.slider("Rotate (degrees)", -180, 180, 0, 15, key=f"rotate_{selected_idx}")
+                
+                with col2:
+                    resize_percent = st.slider("Resize (%)", 25, 200, 100, 5, key=f"resize_{selected_idx}")
+                
+                with col3:
+                    preview_transform = st.form_submit_button("🔄 Preview Transform")
+                    save_transform = st.form_submit_button("✅ Apply Transform", type="primary")
+            
+            if preview_transform or save_transform:
+                # Apply right after Preview with the same settings reuses the previewed result
+                temp_edited = cache_per_image(
+                    'edit_cache', get_edited_image(selected_idx),
+                    ('transform', crop_preset, rotate_angle, resize_percent),
+                    lambda img: apply_transform(img, CROP_PRESETS[crop_preset], rotate_angle, resize_percent),
+                    max_entries=EDIT_CACHE_SIZE
+                )
+                
+                if save_transform:
                     st.session_state.edited_images[selected_idx] = temp_edited
-                    preview_placeholder.image(temp_edited, use_container_width=True)
                     st.success("✅ Transform applied!")
+                
+                preview_placeholder.image(preview_image(temp_edited), use_container_width=True)
         
         with st.expander("🧹 Noise Reduction & Enhancement"):
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                noise_strength = st.slider("Noise Reduction", 0, 3, 0, key=f"noise_{selected_idx}")
-            
-            with col2:
-                upscale_factor = st.radio("Upscale Resolution", [1, 2, 4], key=f"upscale_{selected_idx}")
+            # Controls live in a form so changing them doesn't rerun the whole script
+            with st.form(f"enhance_form_{selected_idx}"):
+                col1, col2, col3 = st.columns(3)
+                
+                with col1:
+                    noise_strength = st.slider("Noise Reduction", 0, 3, 0, key=f"noise_{selected_idx}")
+                
+                with col2:
+                    upscale_factor = st.radio("Upscale Resolution", [1, 2, 4], key=f"upscale_{selected_idx}")
+                
+                with col3:
+                    preview_enhance = st.form_submit_button("🔄 Preview Enhancement")
+                    save_enhance = st.form_submit_button("✅ Apply Enhancement", type="primary")
             
-            with col3:
-                if st.button("🔄 Preview Enhancement", key=f"preview_enhance_{selected_idx}"):
-                    temp_edited = st.session_state.working_images[selected_idx].copy()
-                    
+            if preview_enhance or save_enhance:
+                def enhance(image):
+                    # Both steps return new images, so the working image needs no defensive copy
                     if noise_strength > 0:
-                        temp_edited = apply_noise_reduction(temp_edited, noise_strength)
-                    
+                        image = apply_noise_reduction(image, noise_strength)
                     if upscale_factor > 1:
-                        temp_edited = upscale_image(temp_edited, upscale_factor)
-                    
-                    preview_placeholder.image(temp_edited, use_container_width=True)
+                        image = upscale_image(image, upscale_factor)
+                    return image
                 
-                if st.button("✅ Apply Enhancement", key=f"enhance_{selected_idx}", type="primary"):
-                    temp_edited = st.session_state.working_images[selected_idx].copy()
-                    
-                    if noise_strength > 0:
-                        temp_edited = apply_noise_reduction(temp_edited, noise_strength)
-                    
-                    if upscale_factor > 1:
-                        temp_edited = upscale_image(temp_edited, upscale_factor)
-                    
-                    st.session_state.working_images[selected_idx] = temp_edited
+                temp_edited = cache_per_image(
+                    'edit_cache', get_edited_image(selected_idx),
+                    ('enhance', noise_strength, upscale_factor), enhance,
+                    max_entries=EDIT_CACHE_SIZE
+                )
+                
+                if save_enhance:
                     st.session_state.edited_images[selected_idx] = temp_edited
-                    preview_placeholder.image(temp_edited, use_container_width=True)
                     st.success("✅ Enhanced!")
+                
+                preview_placeholder.image(preview_image(temp_edited), use_container_width=True)
         
         # Batch apply
-        if len(st.session_state.original_images) > 1:
+        if len(st.session_state.original_bytes) > 1:
             st.markdown("---")
             if st.button("🔄 Apply Current Image Settings to All Images", type="primary"):
                 with st.spinner("Processing all images..."):
-                    for i in range(len(st.session_state.original_images)):
-                        if i != selected_idx:  # Skip current image as it's already edited
-                            edited = apply_basic_adjustments(
-                                st.session_state.working_images[i],
-                                brightness, contrast, saturation, sharpness
-                            )
-                            st.session_state.working_images[i] = edited
-                            st.session_state.edited_images[i] = edited
-                    st.success(f"✅ Applied to all {len(st.session_state.original_images)} images!")
+                    # Skip current image as it's already edited, and every image when no slider moved
+                    if slider_state == BASIC_SLIDER_DEFAULTS:
+                        indices = []
+                    else:
+                        indices = [i for i in range(len(st.session_state.original_bytes)) if i != selected_idx]
+                    sources = {i: get_edited_image(i) for i in indices}
+                    
+                    # One thread per core, each adjusting a different image
+                    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                        results = executor.map(
+                            lambda i: apply_basic_adjustments(sources[i], brightness, contrast, saturation, sharpness),
+                            indices
+                        )
+                        for i, edited in zip(indices, results):
+                            # A no-op hands back its input - leave the slot as it was, so an
+                            # unedited image isn't pinned in memory at full resolution
+                            if edited is not sources[i]:
+                                st.session_state.edited_images[i] = edited
+                    st.success(f"✅ Applied to all {len(st.session_state.original_bytes)} images!")
                     st.rerun()
 
 # TAB 2: Style Conversion
@@ -769,11 +1336,16 @@ with tab2:
             key=f"custom_background_uploader_{st.session_state.uploader_key}"
         )
         
-        if custom_bg_file is not None:
-            st.session_state.custom_background = convert_to_rgb(Image.open(custom_bg_file))
+        bg_problem = check_upload(custom_bg_file.getvalue()) if custom_bg_file is not None else None
+        if bg_problem:
+            st.error(f"❌ Skipped {custom_bg_file.name} ({bg_problem})")
+            st.session_state.custom_background = None
+        elif custom_bg_file is not None:
+            # Memoized on the file bytes, so reruns reuse the decoded image
+            st.session_state.custom_background = decode_image(custom_bg_file.getvalue())
             col_bg1, col_bg2 = st.columns([1, 3])
             with col_bg1:
-                st.image(st.session_state.custom_background, caption="Custom Background", use_container_width=True)
+                st.image(preview_image(st.session_state.custom_background), caption="Custom Background", use_container_width=True)
             with col_bg2:
                 st.success("✅ Custom background loaded! This will be used for all generated variations.")
                 if st.button("❌ Clear Custom Background", key="clear_custom_bg"):
@@ -795,11 +1367,16 @@ with tab2:
             key=f"model_photo_uploader_{st.session_state.uploader_key}"
         )
         
-        if model_photo_file is not None:
-            st.session_state.model_photo = convert_to_rgb(Image.open(model_photo_file))
+        model_problem = check_upload(model_photo_file.getvalue()) if model_photo_file is not None else None
+        if model_problem:
+            st.error(f"❌ Skipped {model_photo_file.name} ({model_problem})")
+            st.session_state.model_photo = None
+        elif model_photo_file is not None:
+            # Memoized on the file bytes, so reruns reuse the decoded image
+            st.session_state.model_photo = decode_image(model_photo_file.getvalue())
             col_model1, col_model2 = st.columns([1, 3])
             with col_model1:
-                st.image(st.session_state.model_photo, caption="Model Photo", use_container_width=True)
+                st.image(preview_image(st.session_state.model_photo), caption="Model Photo", use_container_width=True)
             with col_model2:
                 st.success("✅ Model photo loaded! Will apply style to your images.")
                 st.info("**The AI will:**\n- Analyze the model photo's style and characteristics\n- Apply similar lighting, color grading, and mood\n- Match the overall aesthetic and look")
@@ -828,9 +1405,18 @@ with tab2:
             detected_count = 0
             
             with st.spinner("Analyzing age from photos..."):
-                for idx, image in enumerate(st.session_state.edited_images):
-                    detected_age = detect_age_from_image(image)
+                # Ages are remembered by pixel content, so only new or edited photos go to the API
+                age_memo = st.session_state.setdefault('age_memo', {})
+                
+                # Age needs no more resolution than generation does
+                images = dict(enumerate(get_api_images()))
+                digests = {idx: image_digest(image) for idx, image in images.items()}
+                new_ages = detect_ages({idx: image for idx, image in images.items() if digests[idx] not in age_memo})
+                
+                for idx, digest in digests.items():
+                    detected_age = age_memo.get(digest) or new_ages.get(idx)
                     if detected_age:
+                        age_memo[digest] = detected_age
                         st.session_state.detected_ages[idx] = detected_age
                         detected_count += 1
             
@@ -934,25 +1520,20 @@ with tab2:
             st.markdown("### Select Variations")
             variations = STYLE_VARIATIONS[selected_style]
             
+            # One multiselect instead of a checkbox per variation; keyed per style so switching starts empty
+            st.session_state.selected_samples = st.multiselect(
+                "Variations",
+                list(variations.keys()),
+                default=[var_name for var_name in st.session_state.selected_samples if var_name in variations],
+                key=f"variations_{selected_style}"
+            )
+            
+            # Descriptions are plain text, no widgets
             cols = st.columns(2)
             for idx, (var_name, var_prompt) in enumerate(variations.items()):
                 with cols[idx % 2]:
-                    is_selected = var_name in st.session_state.selected_samples
-                    
-                    with st.container():
-                        st.markdown(f"**{var_name}**")
-                        st.caption(var_prompt[:80] + "...")
-                        
-                        if st.checkbox(
-                            f"Select {var_name}",
-                            key=f"checkbox_{var_name}",
-                            value=is_selected
-                        ):
-                            if var_name not in st.session_state.selected_samples:
-                                st.session_state.selected_samples.append(var_name)
-                        else:
-                            if var_name in st.session_state.selected_samples:
-                                st.session_state.selected_samples.remove(var_name)
+                    st.markdown(f"**{var_name}**")
+                    st.caption(var_prompt[:80] + "...")
             
             # Normal variation generation
             if len(st.session_state.selected_samples) > 0:
@@ -965,44 +1546,10 @@ with tab2:
                     if st.session_state.custom_background is not None:
                         st.info("🖼️ Using custom background for all variations")
                     
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    
-                    total = len(st.session_state.selected_samples) * len(st.session_state.edited_images)
-                    count = 0
-                    
-                    for img_idx, image in enumerate(st.session_state.edited_images):
-                        for var_name in st.session_state.selected_samples:
-                            status_text.text(f"Generating {var_name} for Image {img_idx+1}... ({count+1}/{total})")
-                            
-                            if var_name not in variations:
-                                continue
-                            
-                            var_prompt = variations[var_name]
-                            
-                            # Get age parameters
-                            detected_age = st.session_state.detected_ages.get(img_idx)
-                            
-                            generated = generate_image_variation(
-                                image,
-                                selected_style,
-                                var_prompt,
-                                st.session_state.enhancements,
-                                st.session_state.custom_background,
-                                preserve_age,
-                                target_age,
-                                detected_age
-                            )
-                            
-                            if generated:
-                                key = f"img{img_idx+1}_{var_name}"
-                                st.session_state.generated_images[key] = generated
-                            
-                            count += 1
-                            progress_bar.progress(count / total)
+                    st.session_state.generated_images = generate_selected_variations(
+                        selected_style, variations, preserve_age, target_age, "Generating"
+                    )
                     
-                    status_text.empty()
-                    progress_bar.empty()
                     st.success(f"✅ Generated {len(st.session_state.generated_images)} variations!")
                     st.balloons()
             else:
@@ -1015,37 +1562,22 @@ with tab2:
             st.caption("💡 Tip: Right-click on any image to open in new tab or download directly")
             
             # Grid display with download buttons
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             cols = st.columns(3)
-            for idx, (name, img) in enumerate(st.session_state.generated_images.items()):
+            for idx, (name, data) in enumerate(st.session_state.generated_images.items()):
                 with cols[idx % 3]:
                     # Display image name
                     st.markdown(f"**{name}**")
                     
-                    # Convert to base64 for HTML display (no fullscreen button)
-                    img_byte_arr = io.BytesIO()
-                    
-                    # Convert to RGB for JPEG compatibility
-                    display_img = convert_to_rgb(img)
-                    
-                    display_img.save(img_byte_arr, format='JPEG', quality=95)
-                    img_byte_arr.seek(0)
+                    # Let Streamlit serve the image instead of inlining it as base64 HTML; results are
+                    # kept as JPEG bytes and only decoded here for the preview
+                    st.image(original_preview(data), use_container_width=True)
                     
-                    import base64
-                    img_base64 = base64.b64encode(img_byte_arr.read()).decode()
-                    
-                    # Display using HTML (no fullscreen expansion)
-                    st.markdown(
-                        f'<img src="data:image/jpeg;base64,{img_base64}" style="width:100%; border-radius:8px; box-shadow: 0 2px 8px rgba(0,0,0,0.1);">',
-                        unsafe_allow_html=True
-                    )
-                    
-                    # Individual download button
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    # Individual download button - the stored bytes are the download
                     safe_name = name.replace(' ', '_')
-                    img_byte_arr.seek(0)
                     st.download_button(
                         label="⬇️ Download",
-                        data=img_byte_arr,
+                        data=data,
                         file_name=f"{safe_name}_{timestamp}.jpg",
                         mime="image/jpeg",
                         key=f"download_gen_{idx}",
@@ -1063,44 +1595,9 @@ with tab2:
                     st.session_state.generated_images = {}
                     
                     with st.spinner("Regenerating all variations..."):
-                        progress_bar = st.progress(0)
-                        status_text = st.empty()
-                        
-                        total = len(st.session_state.selected_samples) * len(st.session_state.edited_images)
-                        count = 0
-                        
-                        for img_idx, image in enumerate(st.session_state.edited_images):
-                            for var_name in st.session_state.selected_samples:
-                                status_text.text(f"Regenerating {var_name} for Image {img_idx+1}... ({count+1}/{total})")
-                                
-                                if var_name not in variations:
-                                    continue
-                                
-                                var_prompt = variations[var_name]
-                                
-                                # Get age parameters
-                                detected_age = st.session_state.detected_ages.get(img_idx)
-                                
-                                generated = generate_image_variation(
-                                    image,
-                                    selected_style,
-                                    var_prompt,
-                                    st.session_state.enhancements,
-                                    st.session_state.custom_background,
-                                    preserve_age,
-                                    target_age,
-                                    detected_age
-                                )
-                                
-                                if generated:
-                                    key = f"img{img_idx+1}_{var_name}"
-                                    st.session_state.generated_images[key] = generated
-                                
-                                count += 1
-                                progress_bar.progress(count / total)
-                        
-                        status_text.empty()
-                        progress_bar.empty()
+                        st.session_state.generated_images = generate_selected_variations(
+                            selected_style, variations, preserve_age, target_age, "Regenerating", refresh=True
+                        )
                     
                     st.success(f"✅ Regenerated {len(st.session_state.generated_images)} variations!")
                     st.rerun()
@@ -1109,19 +1606,30 @@ with tab2:
 with tab3:
     st.header("Step 3: Download Your Images")
     
+    # One timestamp shared by every file name in this tab
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
     if st.session_state.edited_images:
         st.subheader("📷 Edited Photos")
         
         col1, col2 = st.columns(2)
         with col1:
-            # Download edited images as ZIP
-            edited_dict = {f"edited_image_{i+1}": img for i, img in enumerate(st.session_state.edited_images)}
-            zip_data = create_zip_file(edited_dict)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # Download edited images as ZIP - built only when the button is clicked. Unedited
+            # photos go in as loaders for their file bytes and are only decoded while the archive is built
+            slots = list(st.session_state.edited_images)
+            edited_zip = get_deferred_zip(
+                'edited',
+                tuple(zip(st.session_state.upload_digests, (id(slot) if slot is not None else None for slot in slots))),
+                [slot for slot in slots if slot is not None],
+                [
+                    (f"edited_image_{i+1}", slot if slot is not None else functools.partial(load_image, data))
+                    for i, (slot, data) in enumerate(zip(slots, st.session_state.original_bytes))
+                ]
+            )
             
             st.download_button(
                 label=f"📦 Download All Edited Photos ({len(st.session_state.edited_images)} images)",
-                data=zip_data,
+                data=edited_zip,
                 file_name=f"edited_photos_{timestamp}.zip",
                 mime="application/zip",
                 use_container_width=True
@@ -1133,13 +1641,19 @@ with tab3:
         
         col1, col2 = st.columns(2)
         with col1:
-            # Download all styled images as ZIP
-            zip_data = create_zip_file(st.session_state.generated_images)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # Download all styled images as ZIP - built on the first click, then reused until the images
+            # change; the results are already JPEG bytes, so the archive only stores them
+            styled_images = st.session_state.generated_images
+            styled_zip = get_deferred_zip(
+                'styled',
+                tuple(styled_images.items()),
+                [],
+                list(styled_images.items())
+            )
             
             st.download_button(
                 label=f"📦 Download All Styled Photos ({len(st.session_state.generated_images)} images)",
-                data=zip_data,
+                data=styled_zip,
                 file_name=f"styled_photos_{timestamp}.zip",
                 mime="application/zip",
                 use_container_width=True
@@ -1153,23 +1667,17 @@ with tab3:
         # Individual downloads
         if st.session_state.get('show_individual', False):
             st.markdown("#### Individual Downloads")
-            for name, img in st.session_state.generated_images.items():
-                img_buffer = io.BytesIO()
-                
-                # Convert to RGB for JPEG compatibility
-                download_img = convert_to_rgb(img)
-                
-                download_img.save(img_buffer, format='JPEG', quality=95)
-                img_buffer.seek(0)
-                
-                safe_name = name.replace(' ', '_')
-                st.download_button(
-                    label=f"⬇️ {name}",
-                    data=img_buffer,
-                    file_name=f"{safe_name}_{timestamp}.jpg",
-                    mime="image/jpeg",
-                    key=f"download_{name}"
-                )
+            
+            # One button for the picked image; its bytes come from the per-image JPEG cache
+            choice = st.selectbox("Pick image", list(st.session_state.generated_images.keys()))
+            safe_name = choice.replace(' ', '_')
+            st.download_button(
+                label=f"⬇️ {choice}",
+                data=st.session_state.generated_images[choice],
+                file_name=f"{safe_name}_{timestamp}.jpg",
+                mime="image/jpeg",
+                key="download_individual"
+            )
     
     if not st.session_state.edited_images and not st.session_state.generated_images:
         st.info("👈 Upload and edit images first to enable downloads")
@@ -1179,15 +1687,14 @@ if st.session_state.username == 'admin':
     with tab_admin:
         st.header("👑 Admin Panel - User Management")
         
-        st.markdown("""
-        <div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                    padding: 20px; border-radius: 10px; margin-bottom: 20px;'>
-            <h3 style='color: white; margin: 0;'>🔧 Administrator Tools</h3>
-            <p style='color: #f0f0f0; margin: 5px 0 0 0; font-size: 0.9em;'>
-                Create and manage user accounts with time-bound or permanent access
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(ADMIN_BANNER_HTML, unsafe_allow_html=True)
+        
+        # Load account info for every user once; shared by all sections below
+        try:
+            all_users = load_all_users()
+        except Exception as e:
+            st.error(f"Error loading user list: {str(e)}")
+            all_users = []
         
         # Two columns for admin functions
         col_left, col_right = st.columns([1, 1])
@@ -1241,6 +1748,8 @@ if st.session_state.username == 'admin':
                                 )
                             
                             if success:
+                                load_all_users.clear()
+                                all_users = load_all_users()
                                 st.success(f"✅ {message}")
                                 st.balloons()
                             else:
@@ -1251,88 +1760,88 @@ if st.session_state.username == 'admin':
         with col_right:
             st.subheader("⏰ Extend User Account")
             
-            # Get list of users with expiry
-            users_with_expiry = []
-            try:
-                for username in auth.credentials.keys():
-                    try:
-                        info = auth.get_account_info(username)
-                        if info and info['has_expiry'] and not info['is_expired']:
-                            users_with_expiry.append(username)
-                    except Exception as e:
-                        # Skip users with format issues
-                        continue
-            except Exception as e:
-                st.error(f"Error loading users: {str(e)}")
-            
-            if users_with_expiry:
-                with st.form("extend_user_form"):
-                    extend_username = st.selectbox(
-                        "Select User to Extend",
-                        users_with_expiry,
-                        help="Only shows users with active trial accounts"
-                    )
-                    
-                    # Show current expiry
-                    if extend_username:
-                        try:
-                            user_info = auth.get_account_info(extend_username)
-                            st.info(f"**Current Status:**\n\n"
-                                   f"⏰ Time remaining: {user_info['time_remaining']}\n\n"
-                                   f"📅 Expires: {user_info['expiry_time']}")
-                        except Exception as e:
-                            st.warning(f"Could not load user info: {str(e)}")
-                    
-                    extend_minutes = st.number_input(
-                        "Additional Minutes",
-                        min_value=10,
-                        max_value=10080,  # 7 days max
-                        value=120,  # Default 2 hours
-                        step=10,  # 10-minute increments
-                        help="How many minutes to add to current expiration (increments of 10 minutes)"
-                    )
-                    extend_hours = extend_minutes / 60  # Convert to hours
-                    
-                    submit_extend = st.form_submit_button("⏰ Extend Account", use_container_width=True, type="primary")
-                    
-                    if submit_extend:
-                        try:
-                            success, message = auth.extend_account(extend_username, extend_hours)
-                            if success:
-                                st.success(f"✅ {message}")
-                            else:
-                                st.error(f"❌ {message}")
-                        except Exception as e:
-                            st.error(f"❌ Error extending account: {str(e)}")
-            else:
-                st.info("ℹ️ No active trial accounts to extend")
+            # Only walk the user list when the admin actually opens the extend form
+            if st.toggle("Show extend form", key="show_extend_form"):
+                # Get list of users with expiry
+                users_with_expiry = [u['username'] for u in all_users if u['has_expiry'] and not u['is_expired']]
+                
+                if users_with_expiry:
+                    with st.form("extend_user_form"):
+                        extend_username = st.selectbox(
+                            "Select User to Extend",
+                            users_with_expiry,
+                            help="Only shows users with active trial accounts"
+                        )
+                        
+                        # Show current expiry
+                        if extend_username:
+                            try:
+                                user_info = next(u for u in all_users if u['username'] == extend_username)
+                                st.info(f"**Current Status:**\n\n"
+                                       f"⏰ Time remaining: {user_info['time_remaining']}\n\n"
+                                       f"📅 Expires: {user_info['expiry_time']}")
+                            except Exception as e:
+                                st.warning(f"Could not load user info: {str(e)}")
+                        
+                        extend_minutes = st.number_input(
+                            "Additional Minutes",
+                            min_value=10,
+                            max_value=10080,  # 7 days max
+                            value=120,  # Default 2 hours
+                            step=10,  # 10-minute increments
+                            help="How many minutes to add to current expiration (increments of 10 minutes)"
+                        )
+                        extend_hours = extend_minutes / 60  # Convert to hours
+                        
+                        submit_extend = st.form_submit_button("⏰ Extend Account", use_container_width=True, type="primary")
+                        
+                        if submit_extend:
+                            try:
+                                success, message = auth.extend_account(extend_username, extend_hours)
+                                if success:
+                                    load_all_users.clear()
+                                    all_users = load_all_users()
+                                    st.success(f"✅ {message}")
+                                else:
+                                    st.error(f"❌ {message}")
+                            except Exception as e:
+                                st.error(f"❌ Error extending account: {str(e)}")
+                else:
+                    st.info("ℹ️ No active trial accounts to extend")
         
         st.markdown("---")
         
         # User list section
         st.subheader("👥 All Users")
         
-        # Get all users
-        all_users = []
-        try:
-            for username in auth.credentials.keys():
-                try:
-                    info = auth.get_account_info(username)
-                    if info:
-                        all_users.append(info)
-                except Exception as e:
-                    # Skip users with issues and show warning
-                    st.warning(f"⚠️ Could not load info for user '{username}': {str(e)}")
-                    continue
-        except Exception as e:
-            st.error(f"Error loading user list: {str(e)}")
-        
         if all_users:
-            # Create a table view
+            # Create a table view - one dataframe instead of an expander per user
             st.markdown("**Active Users:**")
             
+            user_rows = []
             for user_info in all_users:
-                with st.expander(f"👤 {user_info['username']}", expanded=False):
+                if user_info['is_expired']:
+                    status = "❌ EXPIRED"
+                elif user_info['has_expiry']:
+                    status = f"✅ Active ({user_info['time_remaining']} left)"
+                else:
+                    status = "✅ Active (No expiry)"
+                
+                user_rows.append({
+                    "Username": user_info['username'],
+                    "Account Type": "🕐 Temporary (Trial)" if user_info['has_expiry'] else "✨ Permanent",
+                    "Status": status,
+                    "Expiry Date": user_info['expiry_time'] if user_info['has_expiry'] else "Never"
+                })
+            
+            st.dataframe(user_rows, use_container_width=True, hide_index=True)
+            
+            # Details for a single user on demand
+            inspect_username = st.selectbox("Inspect user", [u['username'] for u in all_users])
+            user_info = next((u for u in all_users if u['username'] == inspect_username), None)
+            
+            if user_info:
+                with st.expander(f"👤 {user_info['username']}", expanded=True):
                     col_info1, col_info2 = st.columns(2)
                     
                     with col_info1:
@@ -1362,11 +1871,18 @@ if st.session_state.username == 'admin':
         st.subheader("📊 Quick Statistics")
         
         try:
-            total_users = len(auth.credentials)
-            trial_users = len([u for u in all_users if u['has_expiry']])
+            total_users = len(all_users)
+            
+            # Count everything in a single pass over the snapshot
+            trial_users = expired_users = active_trial_users = 0
+            for u in all_users:
+                if u['has_expiry']:
+                    trial_users += 1
+                    if not u['is_expired']:
+                        active_trial_users += 1
+                if u['is_expired']:
+                    expired_users += 1
             permanent_users = total_users - trial_users
-            expired_users = len([u for u in all_users if u['is_expired']])
-            active_trial_users = len([u for u in all_users if u['has_expiry'] and not u['is_expired']])
             
             col_stat1, col_stat2, col_stat3, col_stat4 = st.columns(4)
             
@@ -1393,72 +1909,16 @@ with st.sidebar:
     auth.show_user_info(location='sidebar')
     
     st.header("ℹ️ PhotoStyle Pro")
-    st.markdown("""
-    ### Features:
-    
-    **Photo Editing:**
-    - ✅ Batch upload & processing
-    - ✅ Brightness, contrast, saturation
-    - ✅ Crop with presets (Instagram, LinkedIn, etc.)
-    - ✅ Rotate & resize
-    - ✅ Noise reduction
-    - ✅ AI upscaling
-    
-    **AI Style Conversion:**
-    - ✅ 6 style categories (Passport, Professional, Fun, Artistic, Vintage, Modern)
-    - ✅ 4 variations per style
-    - ✅ Custom background replacement
-    - ✅ Professional enhancements
-    - ✅ Remove grey hair option
-    - ✅ AI age detection
-    - ✅ Age preservation or transformation
-    - ✅ Passport photo specifications
-    - ✅ Head-to-chest crop for professional
-    
-    **Download Options:**
-    - ✅ Bulk ZIP download
-    - ✅ Individual image download
-    
-    ---
-    
-    **Privacy:** No images stored on servers
-    
-    **Powered by:** Google Gemini 2.5 Flash
-    """)
+    st.markdown(SIDEBAR_FEATURES_MD)
     
     st.markdown("---")
     
     if st.button("🔄 Reset Everything", use_container_width=True, type="primary"):
-        # Save authentication state before clearing
-        is_authenticated = st.session_state.get('authenticated', False)
-        current_username = st.session_state.get('username', None)
-        current_login_time = st.session_state.get('login_time', None)
-        
         # Only proceed if user is authenticated
-        if is_authenticated:
-            # Clear Streamlit cache
-            st.cache_data.clear()
-            st.cache_resource.clear()
-            
-            # Clear all session state
-            st.session_state.clear()
-            
-            # Restore authentication state
-            st.session_state.authenticated = True
-            st.session_state.username = current_username
-            st.session_state.login_time = current_login_time
-            
-            # Force new uploader key
-            import time
-            st.session_state.uploader_key = int(time.time())
-            
+        if st.session_state.get('authenticated', False):
+            reset_workspace()
             st.rerun()
 
 # Footer
 st.markdown("---")
-st.markdown(
-    "<p style='text-align: center; color: #666; font-size: 14px;'>"
-    "🔒 <b>Privacy First:</b> All processing happens in real-time. No images are stored on our servers."
-    "</p>",
-    unsafe_allow_html=True
-)
\ No newline at end of file
+st.markdown(FOOTER_HTML, unsafe_allow_html=True)
\ No newline at end of file
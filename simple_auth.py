@@ -3,11 +3,29 @@ Simple Authentication Module for Streamlit
 No OAuth required - uses username/password
 """
 import streamlit as st
+import functools
 import hashlib
 import json
 import os
 from datetime import datetime, timedelta
 
+@functools.lru_cache(maxsize=1024)
+def parse_expiry(expiry):
+    """
+    Parse a stored ISO expiry timestamp
+    
+    Memoized on the string, so repeated status checks for the same account
+    don't re-parse it. Extending an account stores a new string, which
+    simply misses the cache.
+    
+    Args:
+        expiry: ISO format expiry string from the credentials file
+    
+    Returns:
+        datetime of the expiry
+    """
+    return datetime.fromisoformat(expiry)
+
 class SimpleAuthenticator:
     """Simple username/password authentication for Streamlit apps"""
     
@@ -81,7 +99,7 @@ class SimpleAuthenticator:
         
         # Check if account has expired
         if user_data.get('expiry'):
-            expiry_time = datetime.fromisoformat(user_data['expiry'])
+            expiry_time = parse_expiry(user_data['expiry'])
             if datetime.now() > expiry_time:
                 return False, "Account has expired. Please contact support."
         
@@ -164,12 +182,13 @@ class SimpleAuthenticator:
         
         if user_data.get('expiry'):
             try:
-                expiry_datetime = datetime.fromisoformat(user_data['expiry'])
+                expiry_datetime = parse_expiry(user_data['expiry'])
+                now = datetime.now()
                 info['expiry_time'] = expiry_datetime.strftime("%Y-%m-%d %H:%M:%S")
-                info['is_expired'] = datetime.now() > expiry_datetime
+                info['is_expired'] = now > expiry_datetime
                 
                 if not info['is_expired']:
-                    time_remaining = expiry_datetime - datetime.now()
+                    time_remaining = expiry_datetime - now
                     total_seconds = int(time_remaining.total_seconds())
                     hours = total_seconds // 3600
                     minutes = (total_seconds % 3600) // 60
@@ -196,6 +215,19 @@ class SimpleAuthenticator:
         
         return info
     
+    def get_all_account_info(self):
+        """Get account information for all users in a single pass (skips unreadable accounts)"""
+        all_info = []
+        for username in list(self.credentials.keys()):
+            try:
+                info = self.get_account_info(username)
+            except Exception:
+                # Skip users with format issues
+                continue
+            if info:
+                all_info.append(info)
+        return all_info
+    
     def extend_account(self, username, additional_hours):
         """Extend account expiration by additional hours"""
         if username not in self.credentials:
@@ -206,7 +238,7 @@ class SimpleAuthenticator:
         if not user_data.get('expiry'):
             return False, "Account has no expiration (permanent account)"
         
-        current_expiry = datetime.fromisoformat(user_data['expiry'])
+        current_expiry = parse_expiry(user_data['expiry'])
         new_expiry = current_expiry + timedelta(hours=additional_hours)
         
         self.credentials[username]['expiry'] = new_expiry.isoformat()
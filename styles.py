@@ -0,0 +1,89 @@
+"""
+Style tables for the Photo Style Converter
+Prompts, crop presets and enhancement clauses shared by the app
+"""
+
+# Style variations
+STYLE_VARIATIONS = {
+    "passport": {
+        "US Passport": "official US passport photo style, neutral expression, plain white background, head to shoulders visible, centered composition, even lighting, no shadows, professional government document photo",
+        "Indian Passport": "official Indian passport photo style, neutral expression, plain white background, 80% face coverage, ears visible, centered composition, even lighting, professional government document photo",
+        "UK Passport": "official UK passport photo style, neutral expression, plain light grey background, head to shoulders visible, centered composition, even lighting, no shadows, professional government document photo",
+        "EU Passport": "official European Union passport photo style, neutral expression, plain light background, head to shoulders visible, centered composition, even lighting, professional government document photo"
+    },
+    "professional": {
+        "Corporate Executive": "professional corporate executive headshot framed from head to chest level, dark suit, confident expression, modern office background, studio lighting, sharp focus, professional portrait crop",
+        "Creative Professional": "professional creative industry headshot framed from head to chest level, smart casual attire, approachable expression, bright modern workspace, natural lighting, professional portrait crop",
+        "LinkedIn Classic": "classic professional LinkedIn profile photo framed from head to chest level, business formal attire, neutral background, professional studio portrait, proper headshot framing",
+        "Business Casual": "professional business casual style headshot framed from head to chest level, relaxed yet polished, contemporary setting, friendly professional demeanor, proper portrait crop"
+    },
+    "fun": {
+        "Vibrant Pop Art": "fun vibrant pop art style, bold bright colors, playful energy, comic book aesthetic, dynamic composition",
+        "Cheerful Cartoon": "fun cheerful cartoon illustration style, cute animated look, happy colors, whimsical playful mood",
+        "Festival Vibes": "fun festival party vibes, colorful energetic atmosphere, celebration mood, joyful expression, confetti and lights",
+        "Retro Fun": "fun retro 80s style, neon colors, playful vintage aesthetic, energetic disco vibes"
+    },
+    "artistic": {
+        "Oil Painting": "artistic oil painting masterpiece, rich textures, classical art style, museum quality, painterly brushstrokes",
+        "Watercolor Dream": "artistic watercolor painting, soft flowing colors, dreamy ethereal quality, delicate artistic touch",
+        "Digital Art": "artistic digital illustration, modern creative style, vibrant artistic interpretation, unique visual design",
+        "Impressionist": "artistic impressionist style, loose brushwork, play of light, artistic color palette, Monet-inspired"
+    },
+    "doodle": {
+        "Simple Line Doodle": "simple black line doodle sketch, minimalist hand-drawn style, playful cartoon outline, cute simple illustration",
+        "Colored Doodle": "colorful doodle art, vibrant hand-drawn sketch, playful illustrated style, fun cartoon aesthetic",
+        "Notebook Sketch": "casual notebook doodle, pen sketch style, informal hand-drawn look, spontaneous artistic sketch",
+        "Comic Doodle": "comic book doodle style, bold outlines, dynamic cartoon illustration, fun graphic novel aesthetic"
+    },
+    "ghibli": {
+        "Studio Ghibli": "Studio Ghibli anime art style, soft watercolor aesthetic, dreamy whimsical animation, Miyazaki-inspired illustration, gentle pastel colors",
+        "Spirited Away Style": "Spirited Away anime style, detailed Ghibli animation, magical whimsical atmosphere, soft lighting, enchanting scenery",
+        "My Neighbor Totoro": "My Neighbor Totoro art style, warm gentle Ghibli aesthetic, countryside pastoral scenes, soft friendly animation",
+        "Howl's Moving Castle": "Howl's Moving Castle style, romantic Ghibli animation, detailed fantasy aesthetic, magical dreamy atmosphere"
+    },
+    "vintage": {
+        "1970s Film": "vintage 1970s film photography, warm tones, nostalgic film grain, classic retro aesthetic",
+        "Sepia Classic": "vintage sepia tone photograph, antique timeless look, historical photography style",
+        "Polaroid Nostalgia": "vintage polaroid style, instant film aesthetic, faded colors, nostalgic retro charm",
+        "Black & White Classic": "vintage black and white photography, classic film noir style, dramatic contrast, timeless elegance"
+    },
+    "modern": {
+        "Minimalist Chic": "modern minimalist style, clean lines, contemporary aesthetic, simple sophisticated look",
+        "High Fashion": "modern high fashion editorial, sleek polished style, contemporary magazine quality",
+        "Urban Contemporary": "modern urban contemporary style, city vibes, trendy modern aesthetic, sharp details",
+        "Tech Forward": "modern tech-forward style, futuristic clean look, innovative contemporary design"
+    }
+}
+
+# Preset crop ratios
+CROP_PRESETS = {
+    "Instagram Square": (1, 1),
+    "Instagram Portrait": (4, 5),
+    "Facebook Cover": (16, 9),
+    "Passport Photo": (35, 45),
+    "LinkedIn Banner": (4, 1),
+    "Original": None
+}
+
+# Passport photos need faithful colour, so they keep full chroma resolution in JPEG downloads
+FULL_CHROMA_VARIATIONS = frozenset(STYLE_VARIATIONS["passport"])
+
+# Prompt clause per enhancement checkbox, in prompt order; skin tone picks a clause by its option
+ENHANCEMENT_CLAUSES = {
+    'hair': "subtle hair enhancement, slightly fill in any thinning areas naturally, maintain original hairstyle and volume, keep it realistic and close to original appearance",
+    'remove_grey_hair': "restore natural hair color by removing all grey/white hair, convert grey hair to natural darker color that matches the person's original hair color, maintain realistic hair texture and appearance, keep hairstyle unchanged",
+    'skin': "smooth flawless skin, reduced wrinkles and fine lines, even skin tone, no blemishes or imperfections",
+    'skin_tone': {
+        tone: f"adjust skin tone: {description}, ensure natural appearance and avoid unrealistic changes"
+        for tone, description in {
+            'Much Darker': 'deeper, richer skin tone with warm undertones, naturally darker complexion',
+            'Darker': 'slightly deeper skin tone, subtly darker complexion maintaining natural look',
+            'Lighter': 'slightly lighter skin tone, subtly brighter complexion maintaining natural look',
+            'Much Lighter': 'lighter, brighter skin tone with luminous quality, naturally lighter complexion'
+        }.items()
+    },
+    'teeth': "bright white teeth, perfect smile, dental enhancement",
+    'eyes': "bright clear eyes, enhanced eye color, sparkle and clarity, well-defined features",
+    'lighting': "professional studio lighting, perfect illumination, flattering light setup",
+    'sharpness': "enhanced sharpness and clarity, crisp details, high definition quality"
+}
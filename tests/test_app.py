@@ -0,0 +1,55 @@
+import hashlib
+import io
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    """Logged-in app with one uploaded photo, no API key in the environment and no secrets.toml"""
+    # The authenticator rewrites users.json on load, so the app runs against a copy
+    shutil.copy(APP_DIR / "users.json", tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    
+    buffer = io.BytesIO()
+    Image.fromarray(np.zeros((64, 48, 3), np.uint8)).save(buffer, "JPEG")
+    data = buffer.getvalue()
+    
+    at = AppTest.from_file(str(APP_DIR / "app.py"), default_timeout=60)
+    at.session_state.authenticated = True
+    at.session_state.username = "admin"
+    at.session_state.login_time = datetime.now()
+    at.session_state.original_bytes = [data]
+    at.session_state.upload_digests = [hashlib.md5(data).digest()]
+    at.session_state.edited_images = [None]
+    return at.run()
+
+
+def click(at, label):
+    next(button for button in at.button if button.label == label).click()
+    return at.run()
+
+
+def test_detect_age_without_secrets_warns(app):
+    at = click(app, "🔍 Detect Age from Photos")
+    
+    assert not at.exception
+    assert any("API key not found" in warning.value for warning in at.warning)
+
+
+def test_generate_without_secrets_shows_error(app):
+    variations = next(widget for widget in app.multiselect if widget.key.startswith("variations_"))
+    variations.select(variations.options[0])
+    at = click(app.run(), "🎨 Generate Selected Variations")
+    
+    assert not at.exception
+    assert any("API key not found" in error.value for error in at.error)